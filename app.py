@@ -1,22 +1,70 @@
+import asyncio
 import gradio as gr
 
 # Import modules
-from modules.disease_detector import predict_image, analyze_uploaded_plant_image
+from modules.disease_detector import (
+    classify_disease, describe_prediction, analyze_uploaded_plant_image_async
+)
+from modules.inference import run_in_executor
 from modules.knowledge_base import prepare_chroma_from_local_pdfs
-from modules.chat import agent_chatbot_response, clear_chat
-from modules.audio import transcribe_audio
+from modules.chat import agent_chatbot_stream_async, clear_chat, response_cache, answer_bank
+from modules.answer_bank import grow_question, disease_question
+from modules.audio import transcribe_audio_async
+from modules.sessions import session_store
+from modules.prediction_cache import prediction_cache
+from modules.batching import get_batcher_stats
 from modules.ui import get_custom_css, get_logo_html
+from modules.registry import format_status
 from config import OPENAI_API_KEY, BACKGROUND_IMAGE_PATH, LOGO_PATH
 
 
-def handle_uploaded_plant_image(image_path, chat_history):
-    label = analyze_uploaded_plant_image(image_path)
+def format_system_status():
+    stats = response_cache.stats()
+    cache_line = (f"**Response cache**: {stats['hits']} hits / {stats['misses']} misses "
+                  f"({stats['hit_rate']:.0%} hit rate), {stats['entries']} entries, "
+                  f"{stats['invalidations']} invalidations")
+    sessions = session_store.stats()
+    session_line = (f"**Sessions** ({sessions['backend']}): {sessions['sessions']} active, "
+                    f"{sessions['evicted']} evicted")
+    bank = answer_bank.stats()
+    bank_line = (f"**Answer bank**: {bank['entries']} answers, {bank['hits']} served"
+                 f"{' (stale: built from an older index)' if bank['stale'] else ''}")
+    predictions = prediction_cache.stats()
+    prediction_line = (f"**Prediction cache**: {predictions['hits']} hits, {predictions['near_hits']} near-duplicate hits, "
+                       f"{predictions['misses']} misses ({predictions['hit_rate']:.0%} hit rate), "
+                       f"{predictions['entries']} entries")
+    batcher_lines = [
+        (f"**{stats['name']} batcher**: {'on' if stats['enabled'] else 'off'}, up to {stats['max_batch_size']} images "
+         f"or {stats['max_wait_ms']} ms; {stats['queue_depth']} queued, {stats['batches']} batches, "
+         f"{stats['avg_batch_size']:.1f} avg size, {stats['avg_queue_wait_ms']:.1f} ms avg wait")
+        for stats in get_batcher_stats().values()
+    ]
+    return "\n\n".join([format_status(), cache_line, session_line, bank_line, prediction_line] + batcher_lines)
+
+
+def get_session_id(request):
+    # Conversation state is kept per browser session
+    return request.session_hash if request else None
+
+
+async def chat_stream(user_message, chat_history, request: gr.Request):
+    async for chat_history in agent_chatbot_stream_async(user_message, chat_history, get_session_id(request)):
+        yield chat_history
+
+
+def clear_session_chat(request: gr.Request):
+    return clear_chat(get_session_id(request))
+
+
+async def handle_uploaded_plant_image(image_path, chat_history, request: gr.Request):
+    label = await analyze_uploaded_plant_image_async(image_path)
     if label and not label.startswith("⚠️"):
-        question = f"How can i grow {label} ?."
-        chat_history = agent_chatbot_response(question, chat_history)
+        question = grow_question(label)
+        async for chat_history in agent_chatbot_stream_async(question, chat_history, get_session_id(request)):
+            yield chat_history
     else:
         chat_history.append(("System", label))
-    return chat_history
+        yield chat_history
 
 # Build the application UI
 def build_app():
@@ -72,7 +120,7 @@ def build_app():
                         disease_output = gr.Markdown(label="Disease Prediction")
 
                         with gr.Accordion("Detailed Results", open=False):
-                            top_predictions = gr.Plot(label="Confidence Chart")
+                            top_predictions = gr.Label(label="Confidence Chart", num_top_classes=3)
 
                         with gr.Row():
                             with gr.Column():
@@ -112,18 +160,35 @@ def build_app():
                     with gr.Row():
                         chat_clear_button = gr.Button("Clear Chat 🧹", scale=1)
 
+        with gr.Accordion("⚙️ System status", open=False):
+            status_output = gr.Markdown()
+            status_refresh_button = gr.Button("Refresh status", size="sm")
+
         # ==== Custom Logic: Analyze image & Ask Chat ====
-        def analyze_and_ask(image, chat_history):
-            prediction_text, top_preds, description, treatment = predict_image(image)
-
-            if "**Prediction:" in prediction_text:
-                disease_name = prediction_text.split("**Prediction:")[1].split("**")[0].strip()
-                auto_question = f"give me description about this disease: {disease_name}"
-                chat_history = agent_chatbot_response(auto_question, chat_history)  # يرسل لشات مرض النبتة
-            else:
+        async def analyze_and_ask(image, chat_history, request: gr.Request):
+            if image is None:
+                chat_history.append(("System", "⚠️ Disease name could not be extracted."))
+                yield "No image uploaded", None, "", "", chat_history
+                return
+
+            try:
+                ranked = await run_in_executor(classify_disease, image)
+            except Exception as e:
                 chat_history.append(("System", "⚠️ Disease name could not be extracted."))
+                yield f"⚠️ Error processing image: {str(e)}", None, "", "", chat_history
+                return
 
-            return prediction_text, top_preds, description, treatment, chat_history
+            # Build the chart and description while the chat answer is retrieved
+            details = asyncio.ensure_future(run_in_executor(describe_prediction, ranked))
+
+            auto_question = disease_question(ranked[0][0])
+            async for chat_history in agent_chatbot_stream_async(auto_question, chat_history, get_session_id(request)):  # يرسل لشات مرض النبتة
+                try:
+                    prediction_text, top_preds, description, treatment = await details
+                except Exception as e:
+                    # The chat answer keeps streaming; only the prediction panel shows the error
+                    prediction_text, top_preds, description, treatment = f"⚠️ Error processing image: {str(e)}", None, "", ""
+                yield prediction_text, top_preds, description, treatment, chat_history
 
         # ==== Button Actions ====
 
@@ -135,14 +200,14 @@ def build_app():
         )
 
         clear_button.click(
-            lambda: (None, "", "", "", "", []),
+            lambda: (None, "", None, "", "", []),
             inputs=None,
-            outputs=[disease_output, top_predictions, matched_description, treatment_recommendations, chatbot1]
+            outputs=[image_input, disease_output, top_predictions, matched_description, treatment_recommendations, chatbot1]
         )
 
 
         send_button_1.click(
-            agent_chatbot_response,
+            chat_stream,
             inputs=[user_input_1, chatbot1],
             outputs=chatbot1
         ).then(
@@ -152,7 +217,7 @@ def build_app():
         )
 
         user_input_1.submit(
-            agent_chatbot_response,
+            chat_stream,
             inputs=[user_input_1, chatbot1],
             outputs=chatbot1
         ).then(
@@ -163,7 +228,7 @@ def build_app():
 
         # ================= Chatbot farmer assistant ======================
         send_button_2.click(
-            agent_chatbot_response,
+            chat_stream,
             inputs=[user_input_2, chatbot2],
             outputs=chatbot2
         ).then(
@@ -173,7 +238,7 @@ def build_app():
         )
 
         user_input_2.submit(
-            agent_chatbot_response,
+            chat_stream,
             inputs=[user_input_2, chatbot2],
             outputs=chatbot2
         ).then(
@@ -182,13 +247,13 @@ def build_app():
             outputs=user_input_2
         )
         upload_audio.change(
-            transcribe_audio,
+            transcribe_audio_async,
             inputs=upload_audio,
             outputs=user_input_2
         )
 
         chat_clear_button.click(
-            clear_chat,
+            clear_session_chat,
             outputs=chatbot2
         )
 
@@ -197,4 +262,8 @@ def build_app():
             inputs=[plant_image_input, chatbot2],
             outputs=chatbot2
         )
+
+        # ================= Model readiness ======================
+        app.load(format_system_status, outputs=status_output)
+        status_refresh_button.click(format_system_status, outputs=status_output)
     return app
@@ -0,0 +1,31 @@
+"""
+Command line batch diagnosis of a folder (or list) of plant images.
+
+Example:
+    python batch_diagnose.py field_walk/ --output report.csv --models disease fruit
+"""
+import argparse
+import time
+from modules.batch_diagnosis import diagnose_images, write_report, AVAILABLE_MODELS
+from config import BATCH_SIZE, BATCH_PREPROCESS_WORKERS
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Classify many plant images and write a CSV/JSONL report.")
+    parser.add_argument("inputs", nargs="+", help="Image files and/or directories of images")
+    parser.add_argument("--output", default="diagnosis_report.csv", help="Report path (.csv or .jsonl)")
+    parser.add_argument("--models", nargs="+", default=list(AVAILABLE_MODELS), choices=AVAILABLE_MODELS,
+                        help="Models to run on every image")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Images per forward pass")
+    parser.add_argument("--top-k", type=int, default=3, help="Ranked predictions per image and model")
+    parser.add_argument("--workers", type=int, default=BATCH_PREPROCESS_WORKERS, help="Preprocessing threads")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    records = diagnose_images(args.inputs, models=args.models, batch_size=args.batch_size,
+                              top_k=args.top_k, workers=args.workers)
+    count = write_report(records, args.output, top_k=args.top_k)
+    elapsed = time.perf_counter() - start
+
+    images = count // len(args.models)
+    print(f"✅ Wrote {count} results for {images} images to {args.output} "
+          f"in {elapsed:.1f}s ({images / elapsed if elapsed else 0:.1f} images/s)")
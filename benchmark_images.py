@@ -0,0 +1,237 @@
+"""
+Benchmark the image classifiers on CPU.
+
+Measures, for the plant disease model (predict_image) and the
+fruit/vegetable model (classify_fruit_or_vegetable):
+
+- cold latency (first call, including model loading) and warm latency
+- per-stage timings: decode, processor preprocessing, forward pass,
+  softmax/top-k and (disease model only) plotting
+- forward throughput at several batch sizes and torch thread counts
+- peak RSS after each phase
+
+Runs on leaf/produce photos placed in data/benchmarks/images or given with
+--images (falling back to synthetic images when there are none) and saves
+the results as JSON so runs can be compared.
+
+Example:
+    python benchmark_images.py --batch-sizes 1 8 32 --threads 1 4
+"""
+import os
+import glob
+import time
+import argparse
+
+IMAGES_DIR = os.path.join("data", "benchmarks", "images")
+DEFAULT_IMAGES = sorted(
+    path for pattern in ("*.jpg", "*.jpeg", "*.png") for path in glob.glob(os.path.join(IMAGES_DIR, pattern))
+)
+# Synthetic images used when no sample photos are available
+DEFAULT_SYNTHETIC = 8
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the ViT image classifiers on CPU.")
+    parser.add_argument("--images", nargs="+", default=DEFAULT_IMAGES,
+                        help=f"Sample photos (default: the images in {IMAGES_DIR})")
+    parser.add_argument("--synthetic", type=int, default=0,
+                        help="Use this many random images instead of sample images")
+    parser.add_argument("--models", nargs="+", default=["disease", "fruit"], choices=("disease", "fruit"),
+                        help="Models to benchmark")
+    parser.add_argument("--repeat", type=int, default=20, help="Warm calls per model")
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 8, 32], help="Batch sizes for throughput")
+    parser.add_argument("--threads", nargs="+", type=int, default=None,
+                        help="torch thread counts for throughput (default: 1, half and all cores)")
+    parser.add_argument("--iterations", type=int, default=5, help="Timed forward passes per batch size")
+    parser.add_argument("--backend", choices=("torch", "onnx"), default="torch", help="Inference backend")
+    parser.add_argument("--microbatching", action="store_true",
+                        help="Keep online micro-batching on (adds its wait to single-call latency)")
+    parser.add_argument("--full-decode", action="store_true",
+                        help="Decode images at full resolution instead of reduced to the model size")
+    parser.add_argument("--prediction-cache", action="store_true",
+                        help="Keep the prediction cache on (repeat calls then skip the forward pass)")
+    parser.add_argument("--output", default=None, help="Results file (default: timestamped file in data/benchmarks/results)")
+    args = parser.parse_args()
+    if not args.synthetic and not args.images:
+        print(f"Note: no sample photos in {IMAGES_DIR}; benchmarking {DEFAULT_SYNTHETIC} synthetic 640x480 images. "
+              "Add leaf or fruit/vegetable photos there (or pass --images) to measure real JPEG decoding.")
+        args.synthetic = DEFAULT_SYNTHETIC
+    return args
+
+def configure_environment(args):
+    # Read by config.py at import time, so set before importing project modules
+    os.environ["USE_CUDA"] = "0"
+    os.environ["INFERENCE_BACKEND"] = args.backend
+    os.environ["INFERENCE_MICROBATCHING"] = "1" if args.microbatching else "0"
+    os.environ["PREDICTION_CACHE_ENABLED"] = "1" if args.prediction_cache else "0"
+    if args.full_decode:
+        os.environ["IMAGE_DECODE_SIZE"] = "0"
+
+def load_images(args):
+    from PIL import Image
+    import numpy as np
+
+    if args.synthetic:
+        rng = np.random.default_rng(0)
+        count = args.synthetic
+        return [Image.fromarray(rng.integers(0, 256, (480, 640, 3), dtype=np.uint8)) for _ in range(count)], "synthetic"
+    return list(args.images), "files"
+
+def decode_image(image):
+    from modules.image_pipeline import decode_image as pipeline_decode
+
+    return pipeline_decode(image)
+
+def get_entry_point(name):
+    """
+    Get the function the app calls for a model.
+    """
+    if name == "disease":
+        from modules.disease_detector import predict_image
+
+        def predict(image):
+            prediction = predict_image(image)
+            if prediction[0].startswith("⚠️"):
+                raise RuntimeError(prediction[0])
+            return prediction
+        return predict
+
+    from modules.fruit_classifier import classify_fruit_or_vegetable
+    return classify_fruit_or_vegetable
+
+def time_call(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+def benchmark_stages(name, images, repeat):
+    """
+    Time each stage of a single-image prediction separately.
+    """
+    from modules.inference import forward_logits, top_k_predictions
+    from modules.image_pipeline import get_model
+
+    processor, model, class_labels = get_model(name)[0]
+    stages = {"decode": [], "preprocess": [], "forward": [], "topk": []}
+    if name == "disease":
+        from modules.disease_detector import plot_top_predictions
+        stages["plot"] = []
+
+    for i in range(repeat):
+        source = images[i % len(images)]
+        image, seconds = time_call(decode_image, source)
+        stages["decode"].append(seconds)
+        inputs, seconds = time_call(lambda: processor(images=image, return_tensors="pt"))
+        stages["preprocess"].append(seconds)
+        logits, seconds = time_call(forward_logits, model, inputs["pixel_values"])
+        stages["forward"].append(seconds)
+        top, seconds = time_call(top_k_predictions, logits, class_labels, 3)
+        stages["topk"].append(seconds)
+        if "plot" in stages:
+            _, seconds = time_call(plot_top_predictions, top[0])
+            stages["plot"].append(seconds)
+    return stages
+
+def benchmark_throughput(name, images, batch_sizes, thread_counts, iterations):
+    """
+    Measure forward-pass throughput for each thread count and batch size.
+    """
+    import torch
+    from modules.inference import forward_logits
+    from modules.image_pipeline import get_model
+
+    processor, model, _ = get_model(name)[0]
+    decoded = [decode_image(image) for image in images]
+    pixel_values = processor(images=decoded, return_tensors="pt")["pixel_values"]
+
+    results = []
+    default_threads = torch.get_num_threads()
+    try:
+        for threads in thread_counts:
+            torch.set_num_threads(threads)
+            for batch_size in batch_sizes:
+                # Repeat the sample images to fill the batch
+                batch = pixel_values[torch.arange(batch_size) % len(pixel_values)]
+                forward_logits(model, batch)  # warm up this shape
+
+                start = time.perf_counter()
+                for _ in range(iterations):
+                    forward_logits(model, batch)
+                elapsed = time.perf_counter() - start
+
+                results.append({
+                    "threads": threads,
+                    "batch_size": batch_size,
+                    "batch_latency_ms": round(1000 * elapsed / iterations, 3),
+                    "images_per_s": round(batch_size * iterations / elapsed, 2),
+                })
+                print(f"  {name}: threads={threads:<3} batch={batch_size:<3} "
+                      f"{results[-1]['images_per_s']:8.1f} images/s")
+    finally:
+        torch.set_num_threads(default_threads)
+    return results
+
+def run_benchmark(args):
+    from modules.benchmarking import summarize_latencies, format_latencies, peak_rss_mb, save_results
+
+    images, source = load_images(args)
+    thread_counts = args.threads or sorted({1, max(1, (os.cpu_count() or 1) // 2), os.cpu_count() or 1})
+    results = {
+        "config": {
+            "backend": args.backend,
+            "microbatching": args.microbatching,
+            "prediction_cache": args.prediction_cache,
+            "full_decode": args.full_decode,
+            "images": source,
+            "image_count": len(images),
+            "repeat": args.repeat,
+            "batch_sizes": args.batch_sizes,
+            "threads": thread_counts,
+            "iterations": args.iterations,
+        },
+        "models": {},
+    }
+    results["memory_mb"] = {"startup": peak_rss_mb()}
+
+    for name in args.models:
+        print(f"Benchmarking {name} model...")
+        if name == "fruit" and source == "synthetic":
+            # classify_fruit_or_vegetable takes a path
+            import tempfile
+            path = os.path.join(tempfile.mkdtemp(), "synthetic.png")
+            images[0].save(path)
+            entry_images = [path]
+        else:
+            entry_images = images
+
+        # The cold call includes importing and loading everything the first
+        # request would
+        start = time.perf_counter()
+        entry_point = get_entry_point(name)
+        entry_point(entry_images[0])
+        cold = time.perf_counter() - start
+
+        warm = [time_call(entry_point, entry_images[i % len(entry_images)])[1] for i in range(args.repeat)]
+        stages = benchmark_stages(name, images, args.repeat)
+        throughput = benchmark_throughput(name, images, args.batch_sizes, thread_counts, args.iterations)
+
+        results["models"][name] = {
+            "cold_ms": round(cold * 1000, 3),
+            "warm": summarize_latencies(warm),
+            "stages": {stage: summarize_latencies(seconds) for stage, seconds in stages.items()},
+            "throughput": throughput,
+        }
+        results["memory_mb"][name] = peak_rss_mb()
+
+        print(f"  cold: {cold * 1000:.1f} ms")
+        print("  " + format_latencies("warm", results["models"][name]["warm"]))
+        for stage, summary in results["models"][name]["stages"].items():
+            print("  " + format_latencies(stage, summary))
+        print(f"  peak RSS: {results['memory_mb'][name]:.0f} MiB")
+
+    path = save_results(results, args.output, name="images")
+    print(f"✅ Results saved to {path}")
+
+if __name__ == "__main__":
+    args = parse_args()
+    configure_environment(args)
+    run_benchmark(args)
@@ -0,0 +1,164 @@
+"""
+Benchmark knowledge base ingestion and retrieval over data/books.
+
+Builds a separate index (so the app's index is left alone), replays a
+labeled query set and reports ingest throughput, retrieval and offline
+answer latency percentiles, and recall@k. The LLM is replaced by a local
+fake, so no API key or network access is needed. Results are saved as JSON
+for comparing runs, e.g. before and after changing CHUNK_SIZE, k or the
+embedding model.
+
+Example:
+    python benchmark_retrieval.py --chunk-size 300 --k 5 --mode dense
+"""
+import os
+import json
+import time
+import argparse
+
+DEFAULT_QUERIES = os.path.join("data", "benchmarks", "retrieval_queries.json")
+DEFAULT_INDEX_DIR = os.path.join("data", "benchmarks", "chroma_db")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark knowledge base ingestion and retrieval.")
+    parser.add_argument("--books-dir", default=None, help="Folder containing the PDF files (default: BOOKS_DIR)")
+    parser.add_argument("--queries", default=DEFAULT_QUERIES, help="Labeled query set (JSON)")
+    parser.add_argument("--index-dir", default=DEFAULT_INDEX_DIR, help="Where the benchmark index is built")
+    parser.add_argument("--skip-ingest", action="store_true", help="Reuse the existing benchmark index")
+    parser.add_argument("--chunk-size", type=int, default=None, help="Words per chunk (default: CHUNK_SIZE)")
+    parser.add_argument("--k", type=int, default=3, help="Documents retrieved per query")
+    parser.add_argument("--mode", choices=("hybrid", "dense"), default="hybrid", help="Retrieval mode")
+    parser.add_argument("--rerank", action="store_true", help="Enable cross-encoder re-ranking")
+    parser.add_argument("--repeat", type=int, default=5, help="Times each query is replayed for latency")
+    parser.add_argument("--no-embedding-cache", action="store_true",
+                        help="Embed every chunk instead of reusing cached vectors")
+    parser.add_argument("--output", default=None, help="Results file (default: timestamped file in data/benchmarks/results)")
+    return parser.parse_args()
+
+def configure_environment(args):
+    # The settings below are read by config.py at import time, so they must be
+    # set before any project module is imported
+    os.environ["CHROMA_PERSIST_DIR"] = args.index_dir
+    os.environ["RETRIEVAL_MODE"] = args.mode
+    os.environ["RETRIEVAL_K"] = str(args.k)
+    os.environ["RERANKER_ENABLED"] = "1" if args.rerank else "0"
+    os.environ["CHROMA_SYNC_ON_STARTUP"] = "0"
+    if args.no_embedding_cache:
+        os.environ["EMBEDDING_CACHE_ENABLED"] = "0"
+
+def score_retrieval(documents, relevant_sources):
+    """
+    Compare retrieved documents against the labeled relevant sources.
+
+    Returns:
+        dict: recall (fraction of relevant sources retrieved), hit (any
+        relevant source retrieved) and reciprocal_rank of the first hit
+    """
+    retrieved = [doc.metadata.get("source") for doc in documents]
+    relevant = set(relevant_sources)
+    first_hit = next((rank for rank, source in enumerate(retrieved, start=1) if source in relevant), None)
+    return {
+        "recall": len(relevant & set(retrieved)) / len(relevant) if relevant else 0.0,
+        "hit": first_hit is not None,
+        "reciprocal_rank": 1.0 / first_hit if first_hit else 0.0,
+        "retrieved_sources": retrieved,
+    }
+
+def run_benchmark(args):
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from langchain.chains.question_answering.stuff_prompt import PROMPT_SELECTOR
+    from modules.knowledge_base import prepare_chroma_from_local_pdfs, setup_vector_store, load_manifest
+    from modules.context_builder import build_context
+    from modules.benchmarking import summarize_latencies, format_latencies, save_results
+    from config import (
+        BOOKS_DIR, CHUNK_SIZE, CHUNK_OVERLAP, EMBEDDING_MODEL, RETRIEVAL_CANDIDATES, CHROMA_MANIFEST_PATH
+    )
+
+    books_dir = args.books_dir or BOOKS_DIR
+    chunk_size = args.chunk_size or CHUNK_SIZE
+
+    with open(args.queries, "r", encoding="utf-8") as f:
+        labeled = json.load(f)["queries"]
+
+    results = {
+        "config": {
+            "books_dir": books_dir,
+            "chunk_size": chunk_size,
+            "chunk_overlap": CHUNK_OVERLAP,
+            "k": args.k,
+            "mode": args.mode,
+            "candidates": RETRIEVAL_CANDIDATES,
+            "rerank": args.rerank,
+            "embedding_model": EMBEDDING_MODEL,
+            "embedding_cache": not args.no_embedding_cache,
+            "repeat": args.repeat,
+            "queries": len(labeled),
+        },
+        "ingest": None,
+    }
+
+    # ==== Ingestion ====
+    if not args.skip_ingest:
+        start = time.perf_counter()
+        message = prepare_chroma_from_local_pdfs(folder_path=books_dir, chunk_size=chunk_size, rebuild=True)
+        elapsed = time.perf_counter() - start
+        print(message)
+
+        files = load_manifest(CHROMA_MANIFEST_PATH)["files"].values()
+        pages = sum(info.get("pages", 0) for info in files)
+        chunks = sum(info.get("chunks", 0) for info in files)
+        results["ingest"] = {
+            "seconds": round(elapsed, 3),
+            "files": len(files),
+            "pages": pages,
+            "chunks": chunks,
+            "pages_per_s": round(pages / elapsed, 2) if elapsed else None,
+            "chunks_per_s": round(chunks / elapsed, 2) if elapsed else None,
+        }
+        print(f"Ingest: {elapsed:.1f}s, {pages / elapsed:.1f} pages/s, {chunks / elapsed:.1f} chunks/s")
+
+    # ==== Retrieval ====
+    _, _, retriever = setup_vector_store()
+    fake_llm = FakeListChatModel(responses=["This is an offline benchmark answer."])
+    prompt = PROMPT_SELECTOR.get_prompt(fake_llm)
+
+    # Load models and open the index before timing anything
+    retriever.invoke(labeled[0]["query"])
+
+    retrieval_times, answer_times, per_query = [], [], []
+    for item in labeled:
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            documents = retriever.invoke(item["query"])
+            retrieved_at = time.perf_counter()
+            packed = build_context(item["query"], documents)
+            fake_llm.invoke(prompt.format_messages(context=packed["context"], question=item["query"]))
+            answered_at = time.perf_counter()
+
+            retrieval_times.append(retrieved_at - start)
+            answer_times.append(answered_at - start)
+
+        per_query.append(dict(score_retrieval(documents, item["relevant_sources"]), query=item["query"]))
+
+    count = len(per_query)
+    results["retrieval"] = summarize_latencies(retrieval_times)
+    results["answer_offline"] = summarize_latencies(answer_times)
+    results["quality"] = {
+        f"recall_at_{args.k}": round(sum(q["recall"] for q in per_query) / count, 4),
+        f"hit_rate_at_{args.k}": round(sum(q["hit"] for q in per_query) / count, 4),
+        "mrr": round(sum(q["reciprocal_rank"] for q in per_query) / count, 4),
+        "per_query": per_query,
+    }
+
+    print(format_latencies("Retrieval", results["retrieval"]))
+    print(format_latencies("Answer (fake LLM)", results["answer_offline"]))
+    print(f"Recall@{args.k}: {results['quality'][f'recall_at_{args.k}']:.3f}, "
+          f"hit rate: {results['quality'][f'hit_rate_at_{args.k}']:.3f}, MRR: {results['quality']['mrr']:.3f}")
+
+    path = save_results(results, args.output, name="retrieval")
+    print(f"✅ Results saved to {path}")
+
+if __name__ == "__main__":
+    args = parse_args()
+    configure_environment(args)
+    run_benchmark(args)
@@ -0,0 +1,18 @@
+"""
+Offline build step for the answer bank.
+
+Answers every question the image classifiers ask automatically (how to grow
+each fruit/vegetable label, and a description of each bean disease) from the
+knowledge base and writes them to ANSWER_BANK_PATH together with the index
+version. Run it after adding or changing PDFs; the server also rebuilds a
+stale bank at startup unless ANSWER_BANK_AUTO_BUILD=0.
+"""
+import argparse
+from modules.chat import refresh_answer_bank
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the answer bank for the image auto-questions.")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if the bank matches the current index")
+    args = parser.parse_args()
+
+    refresh_answer_bank(force=args.force)
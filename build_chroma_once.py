@@ -1,5 +1,21 @@
-from modules.knowledge_base import prepare_chroma_from_local_pdfs
+"""
+Offline build step for the persistent knowledge base index.
+
+Run this once (and again whenever data/books changes) before starting the
+server; the server then opens the index from CHROMA_PERSIST_DIR as-is.
+"""
+import argparse
+from config import BOOKS_DIR, INGEST_WORKERS
 
 if __name__ == "__main__":
-    message = prepare_chroma_from_local_pdfs()
+    parser = argparse.ArgumentParser(description="Build or update the Chroma knowledge base index.")
+    parser.add_argument("--books-dir", default=BOOKS_DIR, help="Folder containing the PDF files")
+    parser.add_argument("--rebuild", action="store_true", help="Drop the index and re-process every PDF")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS, help="Number of PDF extraction processes")
+    args = parser.parse_args()
+
+    # Imported here so the spawned PDF extraction workers, which re-run this
+    # module's top level, do not load the vector store and embedding stack
+    from modules.knowledge_base import prepare_chroma_from_local_pdfs
+    message = prepare_chroma_from_local_pdfs(folder_path=args.books_dir, rebuild=args.rebuild, workers=args.workers)
     print(message)
@@ -0,0 +1,20 @@
+"""
+Offline build step for the precomputed disease description embeddings.
+
+Downloads the plant disease dataset, embeds every description and writes the
+result to DISEASE_INDEX_PATH, which the server memory-maps at startup.
+"""
+import argparse
+from modules.model_loader import compute_plant_dataset_embeddings
+from modules.disease_index import write_disease_index, SUPPORTED_DTYPES
+from config import DISEASE_INDEX_PATH, DISEASE_INDEX_DTYPE, EMBEDDING_MODEL
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the disease description embedding index.")
+    parser.add_argument("--output", default=DISEASE_INDEX_PATH, help="Path of the index file to write")
+    parser.add_argument("--dtype", default=DISEASE_INDEX_DTYPE, choices=SUPPORTED_DTYPES, help="Storage precision")
+    args = parser.parse_args()
+
+    descriptions, labels, embeddings = compute_plant_dataset_embeddings()
+    write_disease_index(args.output, descriptions, labels, embeddings, dtype=args.dtype, model_name=EMBEDDING_MODEL)
+    print(f"✅ Wrote {len(descriptions)} disease descriptions ({args.dtype}) to {args.output}")
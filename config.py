@@ -16,24 +16,144 @@ LANGSMITH_PROJECT = "zaraa-farmer-project"
 
 # Model configurations
 MODEL_BEAN_CLASSIFIER = "nateraw/vit-base-beans"
+MODEL_FRUIT_CLASSIFIER = "jazzmacedo/fruits-and-vegetables-detector-36"
+PLANT_DISEASE_DATASET = "ipranavks/plant-disease-datasetog"
 EMBEDDING_MODEL = "all-MiniLM-L6-v2"
 GPT_CHAT_MODEL = "gpt-3.5-turbo"
 GPT_CHAT_MODEL_LARGE = "gpt-3.5-turbo-16k"
+# Prompts are packed into a token budget, so the agent fits the 4k model
+GPT_AGENT_MODEL = os.environ.get("GPT_AGENT_MODEL", GPT_CHAT_MODEL)
 WHISPER_MODEL = "whisper-1"
+OPENAI_MAX_CONNECTIONS = int(os.environ.get("OPENAI_MAX_CONNECTIONS", "20"))
+OPENAI_TIMEOUT = float(os.environ.get("OPENAI_TIMEOUT", "60"))
+
+# Embedding settings
+EMBEDDING_BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_CACHE_ENABLED = os.environ.get("EMBEDDING_CACHE_ENABLED", "1") == "1"
+# Rows kept in the on-disk cache of document embeddings (oldest are evicted)
+EMBEDDING_CACHE_MAX_ROWS = int(os.environ.get("EMBEDDING_CACHE_MAX_ROWS", "200000"))
+# Query embeddings kept in memory only, least recently used evicted first
+EMBEDDING_QUERY_CACHE_SIZE = int(os.environ.get("EMBEDDING_QUERY_CACHE_SIZE", "2048"))
 
 # Paths
 DATA_DIR = "data"
 BOOKS_DIR = os.path.join(DATA_DIR, "books")
 BACKGROUND_IMAGE_PATH = os.path.join(DATA_DIR, "Untitled desig.png")
 LOGO_PATH = os.path.join(DATA_DIR, "logo.png")
+CACHE_DIR = os.environ.get("CACHE_DIR", os.path.join(DATA_DIR, "cache"))
+EMBEDDING_CACHE_PATH = os.path.join(CACHE_DIR, "embeddings.sqlite3")
+DISEASE_INDEX_PATH = os.environ.get("DISEASE_INDEX_PATH", os.path.join(DATA_DIR, "disease_index.bin"))
+# Storage precision of the precomputed disease embeddings ("float16" or "float32")
+DISEASE_INDEX_DTYPE = os.environ.get("DISEASE_INDEX_DTYPE", "float16")
 
 # Vector store
 CHROMA_COLLECTION_NAME = "plant_knowledge"
+CHROMA_PERSIST_DIR = os.environ.get("CHROMA_PERSIST_DIR", os.path.join(DATA_DIR, "chroma_db"))
+CHROMA_MANIFEST_PATH = os.path.join(CHROMA_PERSIST_DIR, "manifest.json")
+# Sync the index against BOOKS_DIR at startup (only changed PDFs are processed)
+CHROMA_SYNC_ON_STARTUP = os.environ.get("CHROMA_SYNC_ON_STARTUP", "1") == "1"
 CHUNK_SIZE = 500
 CHUNK_OVERLAP = 50
 
+# Knowledge base retrieval: "hybrid" (BM25 + dense, fused) or "dense"
+RETRIEVAL_MODE = os.environ.get("RETRIEVAL_MODE", "hybrid")
+BM25_INDEX_PATH = os.path.join(CHROMA_PERSIST_DIR, "bm25.sqlite3")
+RETRIEVAL_K = int(os.environ.get("RETRIEVAL_K", "3"))
+RETRIEVAL_CANDIDATES = int(os.environ.get("RETRIEVAL_CANDIDATES", "20"))
+RRF_K = int(os.environ.get("RRF_K", "60"))
+# Optional local cross-encoder re-ranking of the fused candidates
+RERANKER_ENABLED = os.environ.get("RERANKER_ENABLED", "0") == "1"
+RERANKER_MODEL = os.environ.get("RERANKER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_CANDIDATES = int(os.environ.get("RERANK_CANDIDATES", "10"))
+
+# Prompt context budget (tokens) for knowledge base answers; the rest of the
+# 4k window is left for the prompt template and the answer
+CONTEXT_MAX_TOKENS = int(os.environ.get("CONTEXT_MAX_TOKENS", "2400"))
+CONTEXT_HISTORY_TOKENS = int(os.environ.get("CONTEXT_HISTORY_TOKENS", "500"))
+CONTEXT_DEDUP_THRESHOLD = float(os.environ.get("CONTEXT_DEDUP_THRESHOLD", "0.8"))
+
+# Semantic cache of knowledge base answers
+RESPONSE_CACHE_ENABLED = os.environ.get("RESPONSE_CACHE_ENABLED", "1") == "1"
+RESPONSE_CACHE_THRESHOLD = float(os.environ.get("RESPONSE_CACHE_THRESHOLD", "0.92"))
+RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", str(24 * 3600)))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+
+# Precomputed answers for the questions asked after image predictions,
+# rebuilt in the background at startup when the knowledge base index changed
+ANSWER_BANK_ENABLED = os.environ.get("ANSWER_BANK_ENABLED", "1") == "1"
+ANSWER_BANK_PATH = os.environ.get("ANSWER_BANK_PATH", os.path.join(CHROMA_PERSIST_DIR, "answer_bank.json"))
+ANSWER_BANK_AUTO_BUILD = os.environ.get("ANSWER_BANK_AUTO_BUILD", "1") == "1"
+
+# Local intent router: labeled examples and the minimum similarity to an
+# intent centroid (weaker matches are treated as general questions)
+INTENT_EXAMPLES_PATH = os.environ.get("INTENT_EXAMPLES_PATH", os.path.join(DATA_DIR, "intent_examples.json"))
+INTENT_MIN_SCORE = float(os.environ.get("INTENT_MIN_SCORE", "0.35"))
+
+# Chat request ceiling: wall-clock seconds and LLM calls (QA chain, agent
+# runs, hedged retries) allowed per message; 0 disables a limit. A QA chain
+# call or a streamed answer that has not returned (or produced its first
+# token) after CHAT_HEDGE_AFTER seconds gets a hedged second attempt (0 to
+# disable hedging)
+CHAT_DEADLINE = float(os.environ.get("CHAT_DEADLINE", "30"))
+CHAT_CALL_BUDGET = int(os.environ.get("CHAT_CALL_BUDGET", "4"))
+CHAT_HEDGE_AFTER = float(os.environ.get("CHAT_HEDGE_AFTER", "8"))
+CHAT_EXECUTOR_WORKERS = int(os.environ.get("CHAT_EXECUTOR_WORKERS", "16"))
+
+# Per-session conversation state: "memory" or "sqlite" (survives restarts)
+SESSION_BACKEND = os.environ.get("SESSION_BACKEND", "memory")
+SESSION_DB_PATH = os.path.join(CACHE_DIR, "sessions.sqlite3")
+SESSION_IDLE_TTL = float(os.environ.get("SESSION_IDLE_TTL", "3600"))
+SESSION_MAX_SESSIONS = int(os.environ.get("SESSION_MAX_SESSIONS", "1000"))
+SESSION_MAX_TURNS = int(os.environ.get("SESSION_MAX_TURNS", "5"))
+SESSION_MAX_TOKENS = int(os.environ.get("SESSION_MAX_TOKENS", "2000"))
+
+# Ingestion settings
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", os.cpu_count() or 1))
+INGEST_QUEUE_SIZE = int(os.environ.get("INGEST_QUEUE_SIZE", "8"))
+
+# Batch diagnosis settings
+BATCH_SIZE = int(os.environ.get("BATCH_SIZE", "16"))
+BATCH_PREPROCESS_WORKERS = int(os.environ.get("BATCH_PREPROCESS_WORKERS", min(8, os.cpu_count() or 1)))
+
+# Online inference micro-batching
+INFERENCE_MICROBATCHING = os.environ.get("INFERENCE_MICROBATCHING", "1") == "1"
+INFERENCE_MAX_BATCH_SIZE = int(os.environ.get("INFERENCE_MAX_BATCH_SIZE", "8"))
+INFERENCE_MAX_WAIT_MS = float(os.environ.get("INFERENCE_MAX_WAIT_MS", "5"))
+INFERENCE_MAX_QUEUE_SIZE = int(os.environ.get("INFERENCE_MAX_QUEUE_SIZE", "64"))
+
+# Images are decoded reduced to no less than this many pixels per side (the
+# ViTs use 224x224); 0 decodes at full resolution
+IMAGE_DECODE_SIZE = int(os.environ.get("IMAGE_DECODE_SIZE", "224"))
+
+# Cache of classifier outputs keyed by image content; with a dHash distance
+# above 0, re-encoded or resized copies of a cached image also match
+PREDICTION_CACHE_ENABLED = os.environ.get("PREDICTION_CACHE_ENABLED", "1") == "1"
+PREDICTION_CACHE_MAX_ENTRIES = int(os.environ.get("PREDICTION_CACHE_MAX_ENTRIES", "1024"))
+PREDICTION_CACHE_DHASH_DISTANCE = int(os.environ.get("PREDICTION_CACHE_DHASH_DISTANCE", "0"))
+
+# Threads running blocking inference for async request handlers
+INFERENCE_EXECUTOR_WORKERS = int(os.environ.get("INFERENCE_EXECUTOR_WORKERS", "8"))
+
+# Image classifier backend: "torch" or "onnx" (ONNX Runtime, CPU)
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "torch")
+ONNX_DIR = os.environ.get("ONNX_DIR", os.path.join(DATA_DIR, "onnx"))
+ONNX_QUANTIZED = os.environ.get("ONNX_QUANTIZED", "1") == "1"
+ONNX_INTRA_OP_THREADS = int(os.environ.get("ONNX_INTRA_OP_THREADS", os.cpu_count() or 1))
+ONNX_INTER_OP_THREADS = int(os.environ.get("ONNX_INTER_OP_THREADS", "1"))
+
 # Device settings
 DEVICE = "cuda" if os.environ.get("USE_CUDA", "0") == "1" else "cpu"
 
+# Build registered models and chains in the background once the UI is up
+WARMUP_ON_STARTUP = os.environ.get("WARMUP_ON_STARTUP", "1") == "1"
+
+# In-process metrics, served in Prometheus format on METRICS_HOST:METRICS_PORT
+# (port 0 disables the endpoint; set the host to 0.0.0.0 to let a scraper on
+# another machine reach it); spans are also appended to TRACE_LOG_PATH if set
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "9464"))
+TRACE_LOG_PATH = os.environ.get("TRACE_LOG_PATH", "")
+
 # Debug settings
 DEBUG = os.environ.get("DEBUG", "0") == "1"
\ No newline at end of file
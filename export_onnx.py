@@ -0,0 +1,59 @@
+"""
+Export the ViT image classifiers to ONNX (optionally int8 quantized) and
+check the exported models against the PyTorch logits.
+
+Set INFERENCE_BACKEND=onnx to serve the exported models.
+"""
+import sys
+import argparse
+import torch
+from PIL import Image
+from modules.model_loader import load_image_classification_model
+from modules.onnx_backend import (
+    OnnxImageClassifier, onnx_model_path, export_onnx_model, quantize_onnx_model, check_parity
+)
+from config import MODEL_BEAN_CLASSIFIER, MODEL_FRUIT_CLASSIFIER, ONNX_DIR
+
+def load_parity_inputs(processor, image_paths, random_samples=4):
+    """
+    Build parity check inputs from sample images plus random tensors.
+    """
+    batches = [torch.randn(random_samples, 3, 224, 224)]
+    for path in image_paths:
+        with Image.open(path) as image:
+            batches.append(processor(images=image.convert("RGB"), return_tensors="pt")["pixel_values"])
+    return torch.cat(batches)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the image classifiers to ONNX Runtime.")
+    parser.add_argument("--models", nargs="+", default=[MODEL_BEAN_CLASSIFIER, MODEL_FRUIT_CLASSIFIER],
+                        help="Hugging Face model ids to export")
+    parser.add_argument("--onnx-dir", default=ONNX_DIR, help="Output directory")
+    parser.add_argument("--no-quantize", action="store_true", help="Skip the int8 dynamic quantized variant")
+    parser.add_argument("--images", nargs="*", default=[], help="Sample images used in the parity check")
+    args = parser.parse_args()
+
+    all_ok = True
+    for model_name in args.models:
+        processor, torch_model, _ = load_image_classification_model(model_name, backend="torch")
+        torch_model = torch_model.to("cpu")
+        pixel_values = load_parity_inputs(processor, args.images)
+
+        fp32_path = onnx_model_path(model_name, quantized=False, onnx_dir=args.onnx_dir)
+        export_onnx_model(torch_model, fp32_path)
+        variants = [(fp32_path, {"atol": 1e-3})]
+
+        if not args.no_quantize:
+            int8_path = onnx_model_path(model_name, quantized=True, onnx_dir=args.onnx_dir)
+            quantize_onnx_model(fp32_path, int8_path)
+            # Quantization shifts the logits slightly; ranking must mostly hold
+            variants.append((int8_path, {"atol": 1.0, "min_top1_agreement": 0.9}))
+
+        for path, tolerance in variants:
+            parity = check_parity(torch_model, OnnxImageClassifier(path, torch_model.config), pixel_values, **tolerance)
+            all_ok = all_ok and parity["ok"]
+            status = "✅" if parity["ok"] else "⚠️"
+            print(f"{status} {path}: max |Δlogit| = {parity['max_abs_diff']:.4f}, "
+                  f"top-1 agreement = {parity['top1_agreement']:.1%}")
+
+    sys.exit(0 if all_ok else 1)
@@ -2,26 +2,78 @@
 Entry point for the Smart Farming Assistant application.
 """
 import os
-from app import build_app
-from modules.knowledge_base import prepare_chroma_from_local_pdfs
-from config import OPENAI_API_KEY, BACKGROUND_IMAGE_PATH, LOGO_PATH
+import time
+
+# Only lightweight modules are imported at the top level: the PDF extraction
+# workers are spawned and re-run this module's top level, so the app, the
+# models and the LLM clients are imported in main()
+from modules import registry
+from config import (
+    OPENAI_API_KEY, BACKGROUND_IMAGE_PATH, LOGO_PATH, CHROMA_PERSIST_DIR, CHROMA_SYNC_ON_STARTUP, WARMUP_ON_STARTUP,
+    ANSWER_BANK_AUTO_BUILD
+)
+
+def sync_knowledge_base():
+    """
+    Sync the persistent knowledge base with the PDFs on disk.
+    
+    Returns:
+        str: Status message
+    """
+    from modules.knowledge_base import prepare_chroma_from_local_pdfs
+    
+    message = prepare_chroma_from_local_pdfs()
+    print(message)
+    return message
+
+registry.register("knowledge_base_sync", sync_knowledge_base, warm=False)
 
 def main():
     """
     Main function to start the application.
     """
+    start = time.perf_counter()
+    from app import build_app
+    from modules.metrics import start_metrics_server, open_trace_log
+    registry.record_timing("import modules", time.perf_counter() - start)
+    
     # Check configuration
     print(f"API Key status: {'Found in environment' if OPENAI_API_KEY else 'Not found in environment'}")
     print(f"Using local background image: {BACKGROUND_IMAGE_PATH}")
     print(f"Using logo image: {LOGO_PATH}")
+    print(f"Using knowledge base index: {CHROMA_PERSIST_DIR}")
     print("Note: Chroma from langchain is deprecated. Consider updating to langchain-chroma in future versions.")
     
-    # Prepare knowledge base
-    prepare_chroma_from_local_pdfs()
+    # Metrics are served separately from the UI so scrapes never queue
+    # behind chat requests
+    start_metrics_server()
+    open_trace_log()
     
-    # Build and launch the app
+    # Build and launch the app; models are loaded on first use
+    start = time.perf_counter()
     app = build_app()
-    app.launch()
+    registry.record_timing("build UI", time.perf_counter() - start)
+    
+    start = time.perf_counter()
+    app.launch(prevent_thread_lock=True)
+    registry.record_timing("launch server", time.perf_counter() - start)
+    print(registry.format_timings())
+    
+    # Once the UI is up, sync the knowledge base (only new or changed PDFs
+    # are processed) and warm the models in the background
+    startup_tasks = []
+    if CHROMA_SYNC_ON_STARTUP:
+        startup_tasks.append("knowledge_base_sync")
+    if WARMUP_ON_STARTUP:
+        startup_tasks.extend(registry.warmup_names())
+    if ANSWER_BANK_AUTO_BUILD:
+        # Last: a rebuild makes one LLM call per classifier label and must
+        # not hold up the models, and it needs the index synced first
+        startup_tasks.append("answer_bank_refresh")
+    if startup_tasks:
+        registry.warmup(startup_tasks)
+    
+    app.block_thread()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
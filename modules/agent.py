@@ -1,36 +1,91 @@
 """
 LLM agent setup and functionality.
 """
+import time
+import threading
+from typing import Any
 from langchain.agents import initialize_agent, Tool, AgentType
 from langchain.chains import RetrievalQA
+from langchain.chains.question_answering.stuff_prompt import PROMPT_SELECTOR
 from langchain_openai import ChatOpenAI
 from langchain.tools.base import ToolException
 from langchain.prompts import PromptTemplate
+from langchain_core.retrievers import BaseRetriever
 from langsmith import traceable
 from langsmith.wrappers import wrap_openai
-from langchain.memory import ConversationBufferMemory
 from langdetect import detect
 from deep_translator import GoogleTranslator
 from modules.knowledge_base import setup_vector_store
-from modules.disease_detector import predict_image, generate_treatment_tips
-from config import GPT_CHAT_MODEL, GPT_CHAT_MODEL_LARGE, OPENAI_API_KEY
+from modules import registry
+from modules.openai_clients import get_http_client, get_async_http_client
+from modules.sessions import SessionScopedMemory, session_store, current_session
+from modules.context_builder import build_context, format_context_stats
+from modules.metrics import span, observe, increment
+from modules.disease_detector import classify_disease, get_label_match, generate_treatment_tips
+from config import GPT_CHAT_MODEL, GPT_AGENT_MODEL, OPENAI_API_KEY, CHAT_DEADLINE, DEBUG
 
-# Create a memory with a longer history
-memory = ConversationBufferMemory(
+# Agent memory; each Gradio session reads and writes its own history
+memory = SessionScopedMemory(
     memory_key="chat_history", 
-    return_messages=True,
     output_key="output"  # This helps with storing agent outputs
 )
 
-# Setup vector store and retriever
-_, _, retriever = setup_vector_store()
+# Setup vector store and retriever on first use
+registry.register("retriever", lambda: setup_vector_store()[2])
 
-def initialize_qa_chain(api_key=OPENAI_API_KEY):
+# LLM clients, chains and agents shared across the process, keyed by
+# (kind, model, api_key, ...)
+_cache = {}
+_cache_lock = threading.RLock()
+
+def _get_or_create(key, factory):
     """
-    Initialize the QA chain for knowledge retrieval.
+    Return the cached object for key, building it with factory if needed.
+    
+    Failed builds (None) are not cached so they are retried next time.
+    """
+    with _cache_lock:
+        if key not in _cache:
+            instance = factory()
+            if instance is None:
+                return None
+            _cache[key] = instance
+        return _cache[key]
+
+def get_chat_model(model, api_key=OPENAI_API_KEY, temperature=0.0, max_tokens=None):
+    """
+    Get a shared ChatOpenAI client.
+    
+    All clients use the process-wide HTTP connection pools.
     
     Args:
+        model: OpenAI chat model name
         api_key: OpenAI API key
+        temperature: Sampling temperature
+        max_tokens: Maximum completion tokens (None for the API default)
+        
+    Returns:
+        ChatOpenAI: The chat model client
+    """
+    return _get_or_create(
+        ("llm", model, api_key, temperature, max_tokens),
+        lambda: ChatOpenAI(
+            model=model,
+            openai_api_key=api_key,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            http_client=get_http_client(),
+            http_async_client=get_async_http_client()
+        )
+    )
+
+def initialize_qa_chain(api_key=OPENAI_API_KEY, model=GPT_CHAT_MODEL):
+    """
+    Get the QA chain for knowledge retrieval, creating it once per model and key.
+    
+    Args:
+        api_key: OpenAI API key
+        model: OpenAI chat model name
         
     Returns:
         RetrievalQA: The initialized QA chain or None
@@ -38,14 +93,20 @@ def initialize_qa_chain(api_key=OPENAI_API_KEY):
     if not api_key:
         return None
     
+    return _get_or_create(("qa_chain", model, api_key), lambda: _build_qa_chain(api_key, model))
+
+def _build_qa_chain(api_key, model):
     try:
+        retriever = registry.get("retriever")
+        
         # Initialize the language model
-        llm = ChatOpenAI(model=GPT_CHAT_MODEL, openai_api_key=api_key, temperature=0)
+        llm = get_chat_model(model, api_key, temperature=0)
         
-        # Create the QA chain
+        # Create the QA chain; its "stuff" prompt gets the same token budget
+        # as the streamed answers
         chain = RetrievalQA.from_chain_type(
             llm=llm,
-            retriever=retriever,
+            retriever=PackedRetriever(retriever=retriever, model=model),
             chain_type="stuff",
             return_source_documents=True
         )
@@ -55,13 +116,99 @@ def initialize_qa_chain(api_key=OPENAI_API_KEY):
         print(f"Error initializing QA chain: {str(e)}")
         return None
 
+def pack_context(query, documents, history=(), model=GPT_CHAT_MODEL):
+    """
+    Fit retrieved documents and history into the prompt token budget.
+    
+    Args:
+        query: Question to answer
+        documents: Retrieved documents, best first
+        history: List of (question, answer) pairs, oldest first
+        model: OpenAI chat model name (selects the tokenizer)
+        
+    Returns:
+        dict: build_context result (context, chat_history, documents, stats)
+    """
+    packed = build_context(query, documents, history, model=model)
+    stats = packed["stats"]
+    increment("prompt_context_tokens", stats["context_tokens"])
+    increment("prompt_context_chunks", stats["documents_used"], result="used")
+    increment("prompt_context_chunks", stats["documents_retrieved"] - stats["documents_used"], result="dropped")
+    if DEBUG:
+        print(format_context_stats(stats))
+    return packed
+
+class PackedRetriever(BaseRetriever):
+    """
+    Retriever whose documents are packed into the prompt token budget.
+    
+    Wraps the knowledge base retriever for the RetrievalQA chain, so the
+    documents it stuffs into the prompt are deduplicated and fit the budget
+    like those of the streamed answers (see pack_context).
+    
+    Attributes:
+        retriever: Knowledge base retriever
+        model: OpenAI chat model name (selects the tokenizer)
+    """
+    
+    retriever: Any
+    model: str = GPT_CHAT_MODEL
+    
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        with span("retrieval"):
+            documents = self.retriever.invoke(query)
+        return pack_context(query, documents, model=self.model)["documents"]
+
+async def aretrieve_documents(query):
+    """
+    Retrieve knowledge base documents for a query without blocking the event loop.
+    
+    Args:
+        query: Question to search for
+        
+    Returns:
+        list: Retrieved documents
+    """
+    with span("retrieval"):
+        return await registry.get("retriever").ainvoke(query)
+
+async def astream_answer(query, context, api_key=OPENAI_API_KEY, model=GPT_CHAT_MODEL):
+    """
+    Stream an answer grounded in the given context.
+    
+    Uses the same "stuff" prompt as the QA chain.
+    
+    Args:
+        query: Question to answer
+        context: Context packed into the prompt token budget (the "context"
+            of pack_context, whose "documents" are the answer's sources)
+        api_key: OpenAI API key
+        model: OpenAI chat model name
+        
+    Yields:
+        str: Answer text as it is generated
+    """
+    llm = get_chat_model(model, api_key, temperature=0)
+    prompt = PROMPT_SELECTOR.get_prompt(llm)
+    
+    start = time.perf_counter()
+    first_token = True
+    with span("llm", model=model):
+        async for chunk in llm.astream(prompt.format_messages(context=context, question=query)):
+            if chunk.content:
+                if first_token:
+                    observe("llm_first_token", time.perf_counter() - start, model=model)
+                    first_token = False
+                yield chunk.content
+
 @traceable(name="InitializeFarmingAgent", tags=["agent", "setup"])
-def initialize_farming_agent(api_key=OPENAI_API_KEY):
+def initialize_farming_agent(api_key=OPENAI_API_KEY, model=GPT_AGENT_MODEL):
     """
-    Initialize an agent with farming-related tools.
+    Get an agent with farming-related tools, creating it once per model and key.
     
     Args:
         api_key: OpenAI API key
+        model: OpenAI chat model name used by the agent
         
     Returns:
         Agent: The initialized farming agent or None
@@ -69,29 +216,23 @@ def initialize_farming_agent(api_key=OPENAI_API_KEY):
     if not api_key:
         return None
     
+    return _get_or_create(("farming_agent", model, api_key), lambda: _build_farming_agent(api_key, model))
+
+def _build_farming_agent(api_key, model):
     try:
         # Initialize the QA chain first
         qa_chain = initialize_qa_chain(api_key)
         if not qa_chain:
             return None
+        retriever = registry.get("retriever")
         
-        # Initialize the language model with minimal temperature for consistent responses
-        llm = ChatOpenAI(
-            model=GPT_CHAT_MODEL_LARGE,
-            openai_api_key=api_key, 
-            temperature=0.0,  # Use 0 temperature for consistent, deterministic responses
-            max_tokens=1024
-        )
+        # Initialize the language model with 0 temperature for consistent, deterministic responses
+        llm = get_chat_model(model, api_key, temperature=0.0, max_tokens=1024)
         
-        # Create a QA Chain with detailed prompt that emphasizes using ONLY the provided context
-        qa_chain_with_prompt = RetrievalQA.from_chain_type(
-            llm=llm,
-            retriever=retriever,
-            chain_type="stuff",
-            return_source_documents=True,
-            chain_type_kwargs={
-                "prompt": PromptTemplate(
-                    template="""You are a helpful farming assistant. Use ONLY the provided context to answer the question.
+        # Detailed prompt that emphasizes using ONLY the provided context; the
+        # context and history are packed into the token budget per question
+        knowledge_base_prompt = PromptTemplate(
+            template="""You are a helpful farming assistant. Use ONLY the provided context to answer the question.
 If the answer is not contained within the context, say: "I'm sorry, I don't have enough information about that in my knowledge base."
 
 If this appears to be a follow-up question (e.g., "tell me more", "explain further", etc.), 
@@ -109,22 +250,17 @@ CHAT HISTORY:
 
 ANSWER:
 """
-                ),
-                "verbose": True
-            }
         )
         
         # Function for disease identification tool
         def identify_disease(image_path):
             try:
-                result = predict_image(image_path)
-                # Extract relevant information
-                disease_name = result[1].replace("**Prediction: ", "").split("**")[0]
-                confidence = result[1].split("(")[1].split(")")[0]
-                description = result[3]
-                treatment = result[4]
+                # Shares the decode and the cached prediction with the UI
+                disease_name, confidence = classify_disease(image_path.strip(), k=1)[0]
+                match = get_label_match(disease_name)
                 
-                return f"Disease: {disease_name}\nConfidence: {confidence}\nDescription: {description}\nTreatment: {treatment}"
+                return (f"Disease: {disease_name.replace('_', ' ').title()}\nConfidence: {confidence:.1%}\n"
+                        f"Description: {match['description']}\nTreatment: {match['treatment']}")
             except Exception as e:
                 raise ToolException(f"Error identifying disease: {str(e)}")
         
@@ -135,25 +271,26 @@ ANSWER:
                 follow_up_phrases = ["tell me more", "explain more", "additional information", "continue", "elaborate"]
                 is_follow_up = any(phrase in query.lower() for phrase in follow_up_phrases)
                 
-                # Get the memory contents
-                memory_contents = memory.load_memory_variables({})
-                chat_history = memory_contents.get("chat_history", "")
-                
+                # Get this session's history
+                history = session_store.get(current_session.get())["agent_turns"]
                 
                 # If it's a follow-up, ensure we have context from previous exchanges
-                if is_follow_up and chat_history:
+                if is_follow_up and history:
                     # Extract more context for the query
                     print(f"Follow-up detected: {query}")
-                    
-                result = qa_chain_with_prompt({
-                    "query": query,
-                    "chat_history": chat_history
-                })
                 
-                response = result["result"]
+                with span("retrieval"):
+                    documents = retriever.invoke(query)
+                packed = pack_context(query, documents, history, model=model)
+                with span("llm", model=model):
+                    response = llm.invoke(knowledge_base_prompt.format(
+                        context=packed["context"],
+                        question=query,
+                        chat_history=packed["chat_history"]
+                    )).content
                 
                 # Add source attribution
-                source_docs = result.get("source_documents", [])
+                source_docs = packed["documents"]
                 if source_docs:
                     sources = []
                     for doc in source_docs:
@@ -231,7 +368,9 @@ ANSWER:
             memory=memory,
             verbose=True,
             handle_parsing_errors=True,
-            max_iterations=5
+            max_iterations=5,
+            # Stop between steps once a chat request's deadline has passed
+            max_execution_time=CHAT_DEADLINE or None
         )
         
         return agent
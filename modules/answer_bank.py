@@ -0,0 +1,191 @@
+"""
+Precomputed answers for the questions the image classifiers ask automatically.
+
+Every fruit/vegetable prediction asks how to grow the predicted label and
+every bean disease prediction asks for a description of the disease, so there
+are only as many distinct questions as classifier labels. Their knowledge
+base answers are generated offline (build_answer_bank.py, or at startup when
+the index changed) and stored with the index version they were built from;
+the chat serves them instantly until the books corpus changes.
+"""
+import os
+import json
+import time
+import threading
+from modules.knowledge_base import get_index_version
+from modules.response_cache import normalize_query
+from modules.metrics import increment
+from config import (
+    ANSWER_BANK_PATH, ANSWER_BANK_ENABLED, CHROMA_MANIFEST_PATH, MODEL_BEAN_CLASSIFIER, MODEL_FRUIT_CLASSIFIER
+)
+
+def grow_question(label):
+    """
+    Question asked for a fruit/vegetable prediction.
+    """
+    return f"How can i grow {label} ?."
+
+def disease_question(label):
+    """
+    Question asked for a plant disease prediction.
+    """
+    return f"give me description about this disease: {label.replace('_', ' ').title()}"
+
+def auto_questions():
+    """
+    List every question the image classifiers can ask.
+
+    Only the model configs are downloaded to read the labels, not the weights.
+
+    Returns:
+        list: (question, topic) tuples
+    """
+    from transformers import AutoConfig
+
+    questions = []
+    for label in AutoConfig.from_pretrained(MODEL_FRUIT_CLASSIFIER).id2label.values():
+        questions.append((grow_question(label), label.lower()))
+    for label in AutoConfig.from_pretrained(MODEL_BEAN_CLASSIFIER).id2label.values():
+        questions.append((disease_question(label), label.replace('_', ' ')))
+    return questions
+
+class AnswerBank:
+    """
+    Stored answers keyed by normalized question, valid for one index version.
+
+    The file is re-read when it changes on disk, and answers are only served
+    while the knowledge base index is at the version they were built from.
+
+    Args:
+        path: JSON file holding the answers
+        manifest_path: Knowledge base manifest, for the current index version
+        enabled: If False, get always returns None
+    """
+
+    def __init__(self, path=ANSWER_BANK_PATH, manifest_path=CHROMA_MANIFEST_PATH, enabled=ANSWER_BANK_ENABLED):
+        self.path = path
+        self.manifest_path = manifest_path
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._answers = {}
+        self._built_version = None
+        self._index_version = None
+        self._mtimes = (None, None)
+        self.hits = 0
+
+    def get(self, question):
+        """
+        Look up the stored answer for a question.
+
+        Args:
+            question: User question
+
+        Returns:
+            dict or None: {"answer", "topic"}, or None if the question is not
+            in the bank or the bank is stale
+        """
+        if not self.enabled:
+            return None
+        self._refresh()
+        with self._lock:
+            if self._built_version != self._index_version:
+                return None
+            entry = self._answers.get(normalize_query(question))
+            if entry is not None:
+                self.hits += 1
+                increment("answer_bank_hits")
+            return entry
+
+    def is_stale(self):
+        """
+        Whether the bank is missing or was built from an older index.
+        """
+        self._refresh()
+        with self._lock:
+            return self._built_version is None or self._built_version != self._index_version
+
+    def stats(self):
+        """
+        Get the bank's size, freshness and hit count.
+
+        Returns:
+            dict: entries, index_version, stale and hits
+        """
+        stale = self.is_stale()
+        with self._lock:
+            return {
+                "entries": len(self._answers),
+                "index_version": self._built_version,
+                "stale": stale,
+                "hits": self.hits,
+            }
+
+    def _refresh(self):
+        # Re-read the bank and the index version only when their files change
+        mtimes = (_mtime(self.path), _mtime(self.manifest_path))
+        with self._lock:
+            if mtimes == self._mtimes:
+                return
+            self._mtimes = mtimes
+            self._index_version = get_index_version(self.manifest_path)
+            self._answers, self._built_version = {}, None
+            if mtimes[0] is None:
+                return
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                self._answers = {normalize_query(question): entry for question, entry in data["answers"].items()}
+                self._built_version = data["index_version"]
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Error loading answer bank {self.path}: {str(e)}")
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+def build_answer_bank(answer_func, questions=None, path=ANSWER_BANK_PATH, manifest_path=CHROMA_MANIFEST_PATH):
+    """
+    Generate and store the answers for the auto-questions.
+
+    Questions without a sourced answer are left out, so the chat answers
+    them live as before.
+
+    Args:
+        answer_func: Function taking a question and returning
+            (answer with source attribution, whether sources were found)
+        questions: (question, topic) tuples (default: auto_questions())
+        path: JSON file to write
+        manifest_path: Knowledge base manifest, for the index version
+
+    Returns:
+        str: Status message
+    """
+    questions = auto_questions() if questions is None else questions
+    index_version = get_index_version(manifest_path)
+    start = time.perf_counter()
+
+    answers = {}
+    for question, topic in questions:
+        try:
+            answer, has_sources = answer_func(question)
+        except Exception as e:
+            print(f"Error answering '{question}': {str(e)}")
+            continue
+        if has_sources:
+            answers[question] = {"answer": answer, "topic": topic}
+
+    # Write atomically so a running server never reads a partial file
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "index_version": index_version,
+            "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "answers": answers,
+        }, f, indent=2, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+    return (f"✅ Answer bank: {len(answers)}/{len(questions)} questions answered from the knowledge base "
+            f"(index version {index_version}) in {time.perf_counter() - start:.1f}s")
@@ -1,11 +1,14 @@
 """
 Audio transcription functionality.
 """
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
+from modules.openai_clients import get_http_client, get_async_http_client
+from modules.metrics import span
 from config import OPENAI_API_KEY, WHISPER_MODEL
 
-# Initialize OpenAI client
-client = OpenAI(api_key=OPENAI_API_KEY)
+# Initialize OpenAI clients on the shared connection pools
+client = OpenAI(api_key=OPENAI_API_KEY, http_client=get_http_client())
+async_client = AsyncOpenAI(api_key=OPENAI_API_KEY, http_client=get_async_http_client())
 
 def transcribe_audio(audio_path):
     """
@@ -24,7 +27,7 @@ def transcribe_audio(audio_path):
         return "⚠️ No OpenAI API key available. Audio transcription is disabled."
     
     try:
-        with open(audio_path, "rb") as audio_file:
+        with open(audio_path, "rb") as audio_file, span("transcription"):
             transcript = client.audio.transcriptions.create(
                 model=WHISPER_MODEL,
                 file=audio_file,
@@ -32,4 +35,31 @@ def transcribe_audio(audio_path):
             )
         return transcript
     except Exception as e:
-        return f"Error transcribing audio: {str(e)}"
\ No newline at end of file
+        return f"Error transcribing audio: {str(e)}"
+
+async def transcribe_audio_async(audio_path):
+    """
+    Transcribe audio to text without blocking the event loop.
+    
+    Args:
+        audio_path: Path to the audio file
+        
+    Returns:
+        str: Transcribed text or error message
+    """
+    if not audio_path:
+        return ""
+    
+    if not OPENAI_API_KEY:
+        return "⚠️ No OpenAI API key available. Audio transcription is disabled."
+    
+    try:
+        with open(audio_path, "rb") as audio_file, span("transcription"):
+            transcript = await async_client.audio.transcriptions.create(
+                model=WHISPER_MODEL,
+                file=audio_file,
+                response_format="text"
+            )
+        return transcript
+    except Exception as e:
+        return f"Error transcribing audio: {str(e)}"
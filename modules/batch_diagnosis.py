@@ -0,0 +1,154 @@
+"""
+Batch image diagnosis for whole-field scans.
+
+Images are decoded and preprocessed in a thread pool while the previous
+mini-batch runs through the ViT classifiers, and the results are written to
+a CSV or JSONL report.
+"""
+import os
+import csv
+import json
+from concurrent.futures import ThreadPoolExecutor
+import torch
+from modules.inference import forward_logits, top_k_predictions
+from modules.image_pipeline import decode_image, preprocess, get_model, AVAILABLE_MODELS
+from config import BATCH_SIZE, BATCH_PREPROCESS_WORKERS
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tif", ".tiff")
+
+def collect_image_paths(inputs):
+    """
+    Expand a list of image files and directories into image file paths.
+
+    Args:
+        inputs: A path or list of paths (files or directories)
+
+    Returns:
+        list: Sorted image file paths
+    """
+    if isinstance(inputs, str):
+        inputs = [inputs]
+
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                paths.extend(os.path.join(root, f) for f in files if f.lower().endswith(IMAGE_EXTENSIONS))
+        else:
+            paths.append(item)
+    return sorted(paths)
+
+def _preprocess(image_path, classifiers):
+    """
+    Decode one image and preprocess it for every requested model.
+
+    Returns:
+        tuple: (pixel_values per model name, error message or None)
+    """
+    try:
+        image = decode_image(image_path)
+        return preprocess(image, {name: processor for name, (processor, _, _) in classifiers.items()}), None
+    except Exception as e:
+        return None, str(e)
+
+def _classify_batch(batch, classifiers, top_k):
+    """
+    Run one mini-batch through every model and build report records.
+    """
+    records = []
+    ok = [(path, tensors) for path, (tensors, _) in batch if tensors is not None]
+
+    for name, (_, model, class_labels) in classifiers.items():
+        predictions = []
+        if ok:
+            pixel_values = torch.stack([tensors[name] for _, tensors in ok])
+            predictions = top_k_predictions(forward_logits(model, pixel_values), class_labels, top_k)
+        ranked = dict(zip((path for path, _ in ok), predictions))
+
+        for path, (_, error) in batch:
+            records.append({
+                "image": path,
+                "model": name,
+                "predictions": [
+                    {"label": label, "confidence": round(score, 6)} for label, score in ranked.get(path, [])
+                ],
+                "error": error
+            })
+    return records
+
+def diagnose_images(inputs, models=AVAILABLE_MODELS, batch_size=BATCH_SIZE, top_k=3,
+                    workers=BATCH_PREPROCESS_WORKERS):
+    """
+    Classify many images with the ViT models in mini-batches.
+
+    Args:
+        inputs: Image path, directory, or a list of them
+        models: Names of the models to run (see AVAILABLE_MODELS)
+        batch_size: Number of images per forward pass
+        top_k: Number of ranked predictions to report per image and model
+        workers: Number of decode/preprocessing threads
+
+    Yields:
+        dict: One record per image and model with "image", "model",
+        "predictions" (list of {"label", "confidence"}) and "error"
+    """
+    image_paths = collect_image_paths(inputs)
+    # (processor, model, class_labels) per model, loaded like the app's
+    classifiers = {name: get_model(name)[0] for name in models}
+    batches = [image_paths[i:i + batch_size] for i in range(0, len(image_paths), batch_size)]
+    if not batches:
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        def submit(paths):
+            return [(path, executor.submit(_preprocess, path, classifiers)) for path in paths]
+
+        # Preprocess the next mini-batch while the current one is classified
+        pending = submit(batches[0])
+        for next_paths in batches[1:] + [None]:
+            current = [(path, future.result()) for path, future in pending]
+            if next_paths:
+                pending = submit(next_paths)
+            yield from _classify_batch(current, classifiers, top_k)
+
+def write_report(records, output_path, top_k=3):
+    """
+    Write diagnosis records to a CSV or JSONL report.
+
+    The format is chosen from the file extension (.csv or .jsonl).
+
+    Args:
+        records: Iterable of records from diagnose_images
+        output_path: Path of the report file
+        top_k: Number of label/confidence column pairs in CSV reports
+
+    Returns:
+        int: Number of records written
+    """
+    report_format = os.path.splitext(output_path)[1].lower()
+    if report_format not in (".csv", ".jsonl"):
+        raise ValueError(f"Unsupported report format: {output_path} (use .csv or .jsonl)")
+
+    count = 0
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+
+    with open(output_path, "w", newline="", encoding="utf-8") as f:
+        if report_format == ".jsonl":
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                count += 1
+        else:
+            columns = ["image", "model"]
+            for rank in range(1, top_k + 1):
+                columns += [f"label_{rank}", f"confidence_{rank}"]
+            writer = csv.DictWriter(f, fieldnames=columns + ["error"])
+            writer.writeheader()
+            for record in records:
+                row = {"image": record["image"], "model": record["model"], "error": record["error"] or ""}
+                for rank, prediction in enumerate(record["predictions"][:top_k], start=1):
+                    row[f"label_{rank}"] = prediction["label"]
+                    row[f"confidence_{rank}"] = prediction["confidence"]
+                writer.writerow(row)
+                count += 1
+
+    return count
@@ -0,0 +1,187 @@
+"""
+Dynamic micro-batching for the image classifiers.
+
+Concurrent requests are queued and a background thread collects them for up
+to `max_wait_ms` (or until `max_batch_size` items are waiting) before running
+them as a single batched forward pass. Each caller gets its own row back.
+"""
+import time
+import queue
+import threading
+from concurrent.futures import Future
+import torch
+from modules.inference import forward_logits
+from modules.metrics import span, observe, increment, register_gauge
+from config import (
+    INFERENCE_MICROBATCHING, INFERENCE_MAX_BATCH_SIZE, INFERENCE_MAX_WAIT_MS, INFERENCE_MAX_QUEUE_SIZE
+)
+
+# All batchers created in this process, by name
+batchers = {}
+
+class MicroBatcher:
+    """
+    Collect concurrent items and process them in batches on a worker thread.
+
+    Args:
+        process_batch: Function taking a list of items and returning a list
+            of results in the same order
+        max_batch_size: Maximum number of items per batch
+        max_wait_ms: How long the first item of a batch waits for company
+        max_queue_size: Maximum number of waiting items (0 for unbounded);
+            submit blocks when the queue is full
+        enabled: If False, items are processed inline one at a time
+        name: Name used in stats and for the worker thread
+    """
+
+    def __init__(self, process_batch, max_batch_size=INFERENCE_MAX_BATCH_SIZE, max_wait_ms=INFERENCE_MAX_WAIT_MS,
+                 max_queue_size=INFERENCE_MAX_QUEUE_SIZE, enabled=INFERENCE_MICROBATCHING, name="batcher"):
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.enabled = enabled
+        self.name = name
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._worker = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._largest_batch = 0
+        self._total_wait = 0.0
+        batchers[name] = self
+
+    def submit(self, item):
+        """
+        Queue an item for processing.
+
+        Returns:
+            Future: Resolves to the item's result
+        """
+        future = Future()
+        if not self.enabled:
+            self._process([(item, future, time.perf_counter())])
+            return future
+
+        self._ensure_worker()
+        self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    def __call__(self, item, timeout=None):
+        """
+        Process an item and wait for its result.
+        """
+        return self.submit(item).result(timeout=timeout)
+
+    @property
+    def queue_depth(self):
+        """
+        Number of items waiting to be batched.
+        """
+        return self._queue.qsize()
+
+    def stats(self):
+        """
+        Get the batcher's settings and counters.
+
+        Returns:
+            dict: Queue depth, settings, and batch/wait statistics
+        """
+        with self._stats_lock:
+            return {
+                "name": self.name,
+                "enabled": self.enabled,
+                "queue_depth": self.queue_depth,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait_ms,
+                "batches": self._batches,
+                "items": self._items,
+                "largest_batch": self._largest_batch,
+                "avg_batch_size": self._items / self._batches if self._batches else 0.0,
+                "avg_queue_wait_ms": 1000 * self._total_wait / self._items if self._items else 0.0,
+            }
+
+    def _ensure_worker(self):
+        if self._worker is None:
+            with self._lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name=f"{self.name}-batcher", daemon=True)
+                    self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.perf_counter() + self.max_wait_ms / 1000
+
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self._process(batch)
+
+    def _process(self, batch):
+        started = time.perf_counter()
+        for _, _, queued_at in batch:
+            observe("batch_queue_wait", started - queued_at, batcher=self.name)
+        increment("batched_items", len(batch), batcher=self.name)
+        try:
+            with span("batch_forward", batcher=self.name):
+                results = self.process_batch([item for item, _, _ in batch])
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+
+        with self._stats_lock:
+            self._batches += 1
+            self._items += len(batch)
+            self._largest_batch = max(self._largest_batch, len(batch))
+            self._total_wait += sum(started - queued_at for _, _, queued_at in batch)
+
+def create_model_batcher(model, name):
+    """
+    Create a batcher that turns single-image pixel values into logits.
+
+    Items are (channels, height, width) pixel value tensors; results are the
+    matching 1-D logits rows.
+
+    Args:
+        model: Image classification model
+        name: Name of the batcher
+
+    Returns:
+        MicroBatcher: The batcher
+    """
+    def process_batch(pixel_values):
+        return list(forward_logits(model, torch.stack(pixel_values)).cpu())
+
+    return MicroBatcher(process_batch, name=name)
+
+def get_batcher_stats():
+    """
+    Get stats for every batcher in the process.
+
+    Returns:
+        dict: Mapping of batcher name to its stats
+    """
+    return {name: batcher.stats() for name, batcher in batchers.items()}
+
+def _batcher_gauge(stat):
+    return lambda: {(("batcher", name),): float(stats[stat]) for name, stats in get_batcher_stats().items()}
+
+# Settings and batching behaviour of every batcher, read on each scrape
+for _stat, _help in (
+    ("queue_depth", "Items waiting to be batched"),
+    ("max_batch_size", "Largest batch a batcher forms"),
+    ("max_wait_ms", "Milliseconds a batcher waits to fill a batch"),
+    ("avg_batch_size", "Average items per batch"),
+    ("avg_queue_wait_ms", "Average milliseconds an item waited in the queue"),
+    ("largest_batch", "Largest batch formed so far"),
+):
+    register_gauge(f"batcher_{_stat}", _batcher_gauge(_stat), _help)
@@ -0,0 +1,83 @@
+"""
+Shared helpers for the benchmark scripts.
+"""
+import os
+import json
+import time
+import platform
+import numpy as np
+
+def peak_rss_mb():
+    """
+    Get the peak resident memory of this process so far.
+
+    Returns:
+        float: Peak RSS in MiB (current RSS where the peak is unavailable)
+    """
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Reported in KiB on Linux and in bytes on macOS
+        return round(peak / (1024 * 1024 if platform.system() == "Darwin" else 1024), 1)
+    except ImportError:
+        import psutil
+        memory = psutil.Process().memory_info()
+        return round(getattr(memory, "peak_wset", memory.rss) / (1024 * 1024), 1)
+
+def summarize_latencies(seconds):
+    """
+    Summarize a list of latencies.
+
+    Args:
+        seconds: Latencies in seconds
+
+    Returns:
+        dict: count, mean, p50, p95, p99 and max in milliseconds
+    """
+    if not seconds:
+        return {"count": 0}
+    ms = np.asarray(seconds, dtype=np.float64) * 1000
+    return {
+        "count": len(ms),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+
+def format_latencies(name, summary):
+    """
+    Format a latency summary as a one-line report.
+    """
+    if not summary.get("count"):
+        return f"{name}: no samples"
+    return (f"{name}: p50 {summary['p50_ms']:.1f} ms, p95 {summary['p95_ms']:.1f} ms, "
+            f"p99 {summary['p99_ms']:.1f} ms (n={summary['count']})")
+
+def save_results(results, output_path=None, output_dir=os.path.join("data", "benchmarks", "results"), name="benchmark"):
+    """
+    Write benchmark results as JSON, adding the run time and host details.
+
+    Args:
+        results: JSON-serializable results
+        output_path: File to write (defaults to a timestamped file in output_dir)
+        output_dir: Directory for timestamped result files
+        name: File name prefix for timestamped result files
+
+    Returns:
+        str: Path of the written file
+    """
+    if output_path is None:
+        output_path = os.path.join(output_dir, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+
+    results = dict(results, run={
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    })
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    return output_path
@@ -0,0 +1,169 @@
+"""
+Persistent BM25 keyword index over the knowledge base chunks.
+
+Built at ingest time next to the Chroma collection, it finds chunks that
+contain the exact crop, disease or product names a question mentions, which
+dense MiniLM retrieval tends to miss. Postings live in SQLite so the index is
+updated incrementally (per PDF) and is not loaded into memory.
+"""
+import os
+import re
+import json
+import math
+import sqlite3
+import threading
+from collections import Counter
+from langchain_core.documents import Document
+
+# Words too common to help ranking
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from has have how i if in into is it its me my of on or
+our should so than that the their them then there these they this to was we what when where which
+who why will with you your
+""".split())
+
+def tokenize(text):
+    """
+    Split text into lowercase index terms without stopwords.
+
+    Args:
+        text: Text to tokenize
+
+    Returns:
+        list: Terms in order of appearance
+    """
+    return [term for term in re.findall(r"\w+", text.lower()) if term not in STOPWORDS]
+
+class BM25Index:
+    """
+    Okapi BM25 inverted index stored in SQLite.
+
+    Args:
+        path: SQLite database path
+        k1: Term frequency saturation
+        b: Document length normalization
+    """
+
+    def __init__(self, path, k1=1.5, b=0.75):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._corpus_stats = None
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS docs (
+                id TEXT PRIMARY KEY, source TEXT, length INTEGER NOT NULL, text TEXT NOT NULL, metadata TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS postings (term TEXT NOT NULL, doc_id TEXT NOT NULL, tf INTEGER NOT NULL);
+            CREATE INDEX IF NOT EXISTS postings_term ON postings (term);
+            CREATE INDEX IF NOT EXISTS postings_doc ON postings (doc_id);
+            CREATE INDEX IF NOT EXISTS docs_source ON docs (source);
+        """)
+        self._conn.commit()
+
+    def add(self, chunks):
+        """
+        Index chunks, replacing any chunk with the same id.
+
+        Args:
+            chunks: Iterable of (chunk_id, text, metadata) tuples
+        """
+        with self._lock:
+            for chunk_id, text, metadata in chunks:
+                terms = tokenize(text)
+                self._conn.execute("DELETE FROM postings WHERE doc_id = ?", (chunk_id,))
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO docs (id, source, length, text, metadata) VALUES (?, ?, ?, ?, ?)",
+                    (chunk_id, metadata.get("source"), len(terms), text, json.dumps(metadata, ensure_ascii=False))
+                )
+                self._conn.executemany(
+                    "INSERT INTO postings (term, doc_id, tf) VALUES (?, ?, ?)",
+                    [(term, chunk_id, tf) for term, tf in Counter(terms).items()]
+                )
+            self._conn.commit()
+            self._corpus_stats = None
+
+    def delete_source(self, source):
+        """
+        Remove every chunk of a source file.
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM postings WHERE doc_id IN (SELECT id FROM docs WHERE source = ?)", (source,))
+            self._conn.execute("DELETE FROM docs WHERE source = ?", (source,))
+            self._conn.commit()
+            self._corpus_stats = None
+
+    def clear(self):
+        """
+        Remove every chunk.
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM postings")
+            self._conn.execute("DELETE FROM docs")
+            self._conn.commit()
+            self._corpus_stats = None
+
+    def __len__(self):
+        with self._lock:
+            return self._stats()[0]
+
+    def search(self, query, k=10):
+        """
+        Rank chunks by BM25 score.
+
+        Args:
+            query: Query text
+            k: Number of chunks to return
+
+        Returns:
+            list: Up to k (Document, score) pairs, best first; Document.id is
+            the chunk id
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+
+        with self._lock:
+            count, avg_length = self._stats()
+            if not count:
+                return []
+
+            postings = {}
+            for term in terms:
+                rows = self._conn.execute("SELECT doc_id, tf FROM postings WHERE term = ?", (term,)).fetchall()
+                if rows:
+                    postings[term] = rows
+
+            lengths = {}
+            doc_ids = list({doc_id for rows in postings.values() for doc_id, _ in rows})
+            for i in range(0, len(doc_ids), 500):
+                chunk = doc_ids[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                lengths.update(self._conn.execute(
+                    f"SELECT id, length FROM docs WHERE id IN ({placeholders})", chunk
+                ).fetchall())
+
+            scores = Counter()
+            for rows in postings.values():
+                idf = math.log(1 + (count - len(rows) + 0.5) / (len(rows) + 0.5))
+                for doc_id, tf in rows:
+                    norm = 1 - self.b + self.b * lengths.get(doc_id, avg_length) / avg_length
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + self.k1 * norm)
+
+            results = []
+            for doc_id, score in scores.most_common(k):
+                text, metadata = self._conn.execute(
+                    "SELECT text, metadata FROM docs WHERE id = ?", (doc_id,)
+                ).fetchone()
+                results.append((Document(id=doc_id, page_content=text, metadata=json.loads(metadata)), score))
+            return results
+
+    def _stats(self):
+        # Called with the lock held
+        if self._corpus_stats is None:
+            count, avg_length = self._conn.execute("SELECT COUNT(*), AVG(length) FROM docs").fetchone()
+            self._corpus_stats = (count, max(avg_length or 0, 1))
+        return self._corpus_stats
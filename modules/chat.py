@@ -1,23 +1,29 @@
 """
 Chat functionality for the Smart Farming Assistant.
 """
+import time
+import asyncio
+from collections import namedtuple
 from langsmith import traceable
-from modules.agent import initialize_farming_agent, initialize_qa_chain
-from config import OPENAI_API_KEY
+from modules.agent import (
+    initialize_farming_agent, initialize_qa_chain, aretrieve_documents, astream_answer, pack_context
+)
+from modules import registry
+from modules.embeddings import get_embedding_service
+from modules.response_cache import SemanticResponseCache
+from modules.intent_router import create_intent_router, FOLLOW_UP_PREFIX
+from modules.answer_bank import AnswerBank, build_answer_bank
+from modules.sessions import session_store, use_session
+from modules.metrics import span, observe, increment, register_gauge
+from modules.deadline import Deadline, DeadlineExceeded, call_with_deadline, open_hedged_stream
+from config import OPENAI_API_KEY, CHAT_HEDGE_AFTER
 
-# Initialize the farming agent and QA chain
-farming_agent = None
-qa_chain = None
-
-# Create a local conversation context
-conversation_context = {
-    "last_topic": None,
-    "previous_queries": [],
-    "previous_responses": []
-}
-
-# Maximum history to keep
-MAX_CONTEXT_ITEMS = 5
+# Cache of knowledge base answers keyed by query similarity
+response_cache = SemanticResponseCache(get_embedding_service())
+register_gauge("response_cache_entries", lambda: response_cache.stats()["entries"], "Cached knowledge base answers")
+# Stored answers for the questions asked after image predictions
+answer_bank = AnswerBank()
+register_gauge("active_sessions", lambda: session_store.stats()["sessions"], "Sessions with conversation state")
 
 def clean_source_text(source):
     """
@@ -43,10 +49,59 @@ def clean_source_text(source):
         return f"{name_clean}, Page {page_part.strip()}"
     return name_clean
 
-if OPENAI_API_KEY:
-    farming_agent = initialize_farming_agent(OPENAI_API_KEY)
-    agent_knowledge_base = initialize_farming_agent(OPENAI_API_KEY)
-    qa_chain = initialize_qa_chain(OPENAI_API_KEY)
+def format_sources(source_docs):
+    """
+    Build the source attribution line for retrieved documents.
+    
+    Args:
+        source_docs: Documents returned by the QA chain
+        
+    Returns:
+        str: "📚 Sources" suffix to append to a response, or "" if none
+    """
+    sources = []
+    for doc in source_docs:
+        if hasattr(doc, 'metadata') and doc.metadata:
+            source_info = f"{doc.metadata.get('source', 'Unknown source')}"
+            if 'page' in doc.metadata:
+                source_info += f", Page {doc.metadata['page']}"
+            sources.append(source_info)
+    
+    if not sources:
+        return ""
+    
+    unique_sources = list(set(sources))
+    cleaned_sources = [clean_source_text(src) for src in unique_sources]
+    return "\n\n📚 **Sources**: " + "; ".join(cleaned_sources)
+
+def answer_from_knowledge_base(qa_chain, query, deadline=None):
+    """
+    Answer a query with the QA chain, using the semantic response cache.
+    
+    Args:
+        qa_chain: RetrievalQA chain
+        query: Question to answer
+        deadline: Deadline of the request (a slow call is hedged)
+        
+    Returns:
+        tuple: (response with source attribution, whether sources were found)
+    """
+    cached = response_cache.get(query)
+    if cached is not None:
+        return cached
+    
+    qa_result = call_with_deadline(deadline, qa_chain, query, hedge_after=CHAT_HEDGE_AFTER or None, name="qa_chain")
+    source_docs = qa_result.get("source_documents", [])
+    answer = (qa_result["result"] + format_sources(source_docs), bool(source_docs))
+    
+    # Only grounded answers are worth serving again
+    if source_docs:
+        response_cache.put(query, answer)
+    return answer
+
+# The farming agent and QA chain are built on first use (or by the startup warmup)
+registry.register("qa_chain", lambda: initialize_qa_chain(OPENAI_API_KEY))
+registry.register("farming_agent", lambda: initialize_farming_agent(OPENAI_API_KEY))
 
 def identify_topic(message):
     """
@@ -89,260 +144,399 @@ def identify_topic(message):
     
     return None
 
-@traceable(name="SmartFarmingChat", tags=["chat", "agent", "qa"])
-def agent_chatbot_response(user_message, history):
+# Reply for questions that are clearly not about farming
+OFF_TOPIC_RESPONSE = "I'm specifically designed to help with farming and plant-related questions. For this topic, I recommend using a general-purpose assistant or a specialized tool. Can I help you with any farming or gardening questions instead?"
+
+# Reply for greetings, thanks and other small talk
+GREETING_RESPONSE = "Hello! I'm Zara'a, your farming assistant 🌱 Ask me about growing crops, plant diseases and their treatment, soil, watering or pests, or upload a plant image to get a diagnosis."
+
+NO_API_KEY_RESPONSE = "⚠️ No OpenAI API key available in environment variables. Chat features are disabled."
+
+# Reply when the key is set but the QA chain or agent could not be built
+# (they are rebuilt on the next message)
+UNAVAILABLE_RESPONSE = "⚠️ The knowledge base is not available right now. Please try again in a moment."
+
+# Reply when a request ran out of time before any answer was ready
+TIMEOUT_RESPONSE = "⏱️ I'm sorry, this is taking longer than expected. Please try again in a moment or ask a more specific question."
+
+# Reply when neither the knowledge base nor the agent produced an answer
+NO_INFORMATION_RESPONSE = "I'm sorry, but I couldn't find information about this in my knowledge base. Could you rephrase your question or ask about a specific crop, disease or farming practice?"
+
+# Appended to a streamed answer cut off by the request deadline
+TRUNCATED_NOTE = "\n\n⏱️ *(Answer cut short to keep response times low.)*"
+
+# Replies for routes answered without retrieval or the LLM
+CANNED_RESPONSES = {"greeting": GREETING_RESPONSE, "off_topic": OFF_TOPIC_RESPONSE}
+
+# Knowledge base query for each kind of follow-up, given the last topic
+FOLLOW_UP_QUERIES = {
+    "follow_up_treat": "How to treat {topic}",
+    "follow_up_prevent": "How to prevent {topic}",
+    "follow_up_cause": "What causes {topic}",
+    "follow_up_more": "{message} about {topic}",
+}
+
+# How a message is answered: kind is "answer_bank", "greeting", "off_topic",
+# "follow_up", "farming" or "general", query is what is sent to the knowledge
+# base, topic is the topic to remember for follow-ups and answer is the reply
+# when it is known without retrieval or the LLM
+Route = namedtuple("Route", ["kind", "query", "topic", "answer"], defaults=[None])
+
+# The intent router embeds its labeled examples once, on first use (or warmup)
+registry.register("intent_router", create_intent_router)
+
+def route_message(user_message, session_id=None):
     """
-    Generate chatbot response using the farming agent.
+    Decide how to answer a message and which query to send to the knowledge base.
     
     Args:
         user_message: User's message
-        history: Chat history
+        session_id: Session whose last topic is used for follow-ups
         
     Returns:
-        list: Updated chat history
+        Route: The chosen route
+    """
+    # Questions asked after image predictions are answered ahead of time
+    banked = answer_bank.get(user_message)
+    if banked is not None:
+        return Route("answer_bank", user_message, banked["topic"], banked["answer"])
+    
+    try:
+        intent, score = registry.get("intent_router").classify(user_message)
+    except Exception as e:
+        print(f"Error classifying intent: {str(e)}")
+        intent, score = "general", 0.0
+    
+    # Small talk and unrelated questions never reach the knowledge base
+    if intent in CANNED_RESPONSES:
+        return Route(intent, user_message, None, CANNED_RESPONSES[intent])
+    
+    if intent.startswith(FOLLOW_UP_PREFIX):
+        last_topic = session_store.get(session_id)["last_topic"]
+        if last_topic:
+            topic_query = FOLLOW_UP_QUERIES[intent].format(message=user_message, topic=last_topic)
+            
+            # Log for debugging
+            print(f"Follow-up detected ({intent}, {score:.2f}). Original: '{user_message}', Using topic query: '{topic_query}'")
+            return Route("follow_up", topic_query, last_topic)
+        
+        # Nothing to follow up on yet, so answer it as a farming question
+        intent = "farming"
+    
+    return Route(intent, user_message, identify_topic(user_message))
+
+def refresh_answer_bank(force=False):
+    """
+    Rebuild the answer bank if the knowledge base index changed since it was built.
+    
+    Args:
+        force: Rebuild even if the bank is up to date
+        
+    Returns:
+        str: Status message
+    """
+    if not force and not answer_bank.is_stale():
+        message = f"Answer bank is up to date ({answer_bank.stats()['entries']} answers)"
+    elif not registry.get("qa_chain"):
+        message = ("⚠️ The QA chain could not be built; the answer bank was not built." if OPENAI_API_KEY
+                   else "⚠️ No OpenAI API key available; the answer bank was not built.")
+    else:
+        qa_chain = registry.get("qa_chain")
+        message = build_answer_bank(lambda question: answer_from_knowledge_base(qa_chain, question), path=answer_bank.path)
+    print(message)
+    return message
+
+# Rebuilt after the knowledge base sync and model warmup at startup (see main.py)
+registry.register("answer_bank_refresh", refresh_answer_bank, warm=False)
+
+def run_agent(farming_agent, message, session_id=None, deadline=None):
+    """
+    Run the farming agent with the memory of a session.
+    
+    Args:
+        farming_agent: The farming agent
+        message: Message for the agent
+        session_id: Session whose agent memory is used
+        deadline: Deadline of the request
+        
+    Returns:
+        str: Agent output
+    """
+    def run():
+        with use_session(session_id), span("agent_run"):
+            return farming_agent.run(message)
+    
+    # Agent runs have side effects (memory, tool calls), so they are never hedged
+    return call_with_deadline(deadline, run, name="agent")
+
+def answer_without_sources(route, user_message, response, farming_agent, session_id=None, deadline=None):
+    """
+    Handle a knowledge base answer that came back without source documents.
+    
+    Args:
+        route: Route of the message
+        user_message: User's message
+        response: The unsourced knowledge base answer
+        farming_agent: Agent used as fallback for farming questions
+        session_id: Session of the message
+        deadline: Deadline of the request
+        
+    Returns:
+        str: Final response
+    """
+    if route.kind == "follow_up":
+        return f"I'm sorry, but I don't have additional information about {route.topic} in my knowledge base. Would you like to ask about something else?"
+    if route.kind == "farming":
+        # If no source documents found, try using the agent as fallback
+        augmented_message = user_message + " Please include only information from the knowledge base."
+        try:
+            return run_agent(farming_agent, augmented_message, session_id, deadline)
+        except DeadlineExceeded:
+            # Out of time: the unsourced answer is better than nothing
+            return response or TIMEOUT_RESPONSE
+    if response:
+        return response
+    
+    # Nothing was retrieved, so nothing was generated; let the agent answer
+    try:
+        return run_agent(farming_agent, user_message, session_id, deadline)
+    except DeadlineExceeded:
+        return TIMEOUT_RESPONSE
+    except Exception as e:
+        print(f"Error in agent fallback: {str(e)}")
+        return NO_INFORMATION_RESPONSE
+
+def answer_after_error(route, user_message, error, farming_agent, session_id=None, deadline=None):
+    """
+    Handle a failed knowledge base query.
+    
+    Args:
+        route: Route of the message
+        user_message: User's message
+        error: The exception raised by the knowledge base query
+        farming_agent: Agent used as fallback
+        session_id: Session of the message
+        deadline: Deadline of the request
+        
+    Returns:
+        str: Final response
+    """
+    if isinstance(error, DeadlineExceeded):
+        return TIMEOUT_RESPONSE
+    if route.kind == "follow_up":
+        print(f"Error in follow-up handling: {str(error)}")
+        return f"I'm sorry, but I don't have additional information about {route.topic} in my knowledge base. Would you like to ask about something else?"
+    if route.kind == "general":
+        # Fall back to agent
+        return run_agent(farming_agent, user_message, session_id, deadline)
+    
+    # If direct knowledge base query fails, use agent as fallback
+    try:
+        augmented_message = user_message + " Please include only information from the knowledge base with sources."
+        return run_agent(farming_agent, augmented_message, session_id, deadline)
+    except DeadlineExceeded:
+        return TIMEOUT_RESPONSE
+    except Exception:
+        return f"I'm sorry, but I couldn't find information about this in my knowledge base. Error: {str(error)}"
+
+def answer_after_failure(user_message, error, qa_chain, deadline=None):
+    """
+    Last-resort answer when routing or the fallbacks raised.
+    
+    Args:
+        user_message: User's message
+        error: The exception that was raised
+        qa_chain: RetrievalQA chain
+        deadline: Deadline of the request
+        
+    Returns:
+        str: Final response
+    """
+    if isinstance(error, DeadlineExceeded) or (deadline is not None and not deadline.can_spend()):
+        # No time for another LLM call; serve a cached answer if there is one
+        cached = response_cache.get(user_message)
+        return cached[0] if cached is not None else TIMEOUT_RESPONSE
+    try:
+        # Try one more time with just the knowledge base
+        response, _ = answer_from_knowledge_base(qa_chain, user_message, deadline)
+        return response
+    except DeadlineExceeded:
+        return TIMEOUT_RESPONSE
+    except Exception:
+        return f"⚠️ I'm sorry, but I encountered an error processing your request: {str(error)}. Please try rephrasing your question or asking about a farming-related topic."
+
+def remember_exchange(route, user_message, response, session_id=None):
+    """
+    Update a session's conversation context after a turn.
+    
+    Args:
+        route: Route of the message (None if routing failed)
+        user_message: User's message
+        response: Final response
+        session_id: Session of the message
+    """
+    def update(state):
+        # Update the conversation context if this is not a follow-up
+        if route and route.kind != "follow_up" and route.topic:
+            state["last_topic"] = route.topic
+        
+        # Update conversation history (the store keeps it within budget)
+        state["turns"].append([user_message, response])
+    
+    session_store.update(session_id, update)
+
+def finish_streamed_answer(query, answer, source_docs, truncated=False):
+    """
+    Build the final item of a streamed knowledge base answer.
+    
+    Complete answers are cached; answers cut short by the deadline are not.
+    
+    Args:
+        query: Question that was answered
+        answer: Streamed answer text
+        source_docs: Documents the answer is based on
+        truncated: Whether the stream was stopped by the deadline
+        
+    Returns:
+        tuple: (answer with source attribution, True)
+    """
+    if truncated:
+        if not answer:
+            return TIMEOUT_RESPONSE, True
+        return answer + TRUNCATED_NOTE + format_sources(source_docs), True
+    
+    result = (answer + format_sources(source_docs), True)
+    response_cache.put(query, result)
+    return result
+
+async def stream_from_knowledge_base_async(query, deadline=None):
+    """
+    Stream a knowledge base answer, using the semantic response cache.
+    
+    Retrieval and waiting for each token are bounded by the deadline, so a
+    stalled stream is cut short instead of holding the request open, and an
+    answer whose first token is slow gets a hedged second stream.
+    
+    Args:
+        query: Question to answer
+        deadline: Deadline of the request
+        
+    Yields:
+        tuple: (answer so far, has_sources) where has_sources is None until
+        the final item, which carries the source attribution
+    """
+    cached = await asyncio.to_thread(response_cache.get, query)
+    if cached is not None:
+        yield cached
+        return
+    
+    try:
+        source_docs = await asyncio.wait_for(aretrieve_documents(query), deadline.remaining() if deadline else None)
+    except asyncio.TimeoutError:
+        increment("deadline_exceeded", call="retrieval")
+        raise DeadlineExceeded(f"retrieval did not finish within the {deadline.seconds:g}s deadline")
+    if not source_docs:
+        yield "", False
+        return
+    
+    # Only the chunks that fit the prompt are listed as sources
+    packed = await asyncio.to_thread(pack_context, query, source_docs)
+    source_docs = packed["documents"]
+    
+    first, tokens = await open_hedged_stream(
+        deadline, lambda: astream_answer(query, packed["context"], OPENAI_API_KEY),
+        hedge_after=CHAT_HEDGE_AFTER or None, name="llm_stream"
+    )
+    answer, truncated = first or "", False
+    if first is not None:
+        yield answer, None
+    while True:
+        try:
+            token = await asyncio.wait_for(tokens.__anext__(), deadline.remaining() if deadline else None)
+        except StopAsyncIteration:
+            break
+        except asyncio.TimeoutError:
+            truncated = True
+            await tokens.aclose()
+            break
+        answer += token
+        yield answer, None
+    
+    yield await asyncio.to_thread(finish_streamed_answer, query, answer, source_docs, truncated)
+
+@traceable(name="SmartFarmingChatStream", tags=["chat", "agent", "qa", "stream"])
+async def agent_chatbot_stream_async(user_message, history, session_id=None):
     """
-    global conversation_context
+    Generate a chatbot response, streaming the answer as it is produced.
     
+    Knowledge base answers are yielded token by token with the source
+    attribution appended at the end; fallbacks (agent, error handling) are
+    shown when complete. Retrieval and generation are awaited on the Gradio
+    event loop; the blocking steps run in a thread.
+    
+    Args:
+        user_message: User's message
+        history: Chat history
+        session_id: Gradio session id (None for the default session)
+        
+    Yields:
+        list: Updated chat history
+    """
     if not user_message:
-        return history
+        yield history
+        return
+    
+    farming_agent, qa_chain = await asyncio.gather(
+        asyncio.to_thread(registry.get, "farming_agent"),
+        asyncio.to_thread(registry.get, "qa_chain")
+    )
     
     # Check if API keys are available
     if not farming_agent or not qa_chain:
-        response = "⚠️ No OpenAI API key available in environment variables. Chat features are disabled."
-        history.append((user_message, response))
-        return history
-    
-    # Check if this is a follow-up question
-    follow_up_phrases = ["tell me more", "explain more", "additional information", "continue", "elaborate", 
-                         "go on", "what else", "and", "more details", "how to treat", "treatment", 
-                         "how to fix", "how to cure", "is there a way", "can i", "should i",
-                         "this disease", "the disease", "this problem", "the problem"]
-    
-    # Enhanced follow-up detection
-    is_follow_up = (any(phrase in user_message.lower() for phrase in follow_up_phrases) or 
-                   len(user_message.split()) <= 5 or
-                   user_message.lower().startswith("how") or
-                   "this" in user_message.lower() or 
-                   "it" in user_message.lower())
-    
-    # Process the user message
+        history.append((user_message, UNAVAILABLE_RESPONSE if OPENAI_API_KEY else NO_API_KEY_RESPONSE))
+        yield history
+        return
+    
+    history.append((user_message, ""))
+    started = time.perf_counter()
+    deadline = Deadline()
+    route = None
     try:
-        # REPLACE THIS BLOCK with the improved follow-up handling block
-        # If it's a follow-up and we have previous context
-        if is_follow_up and conversation_context["last_topic"]:
-            # Get previous query for context
-            prev_query = ""
-            if conversation_context["previous_queries"]:
-                prev_query = conversation_context["previous_queries"][-1]
-            
-            # Create a more specific query based on the follow-up type
-            if "treat" in user_message.lower() or "cure" in user_message.lower() or "fix" in user_message.lower():
-                topic_query = f"How to treat {conversation_context['last_topic']} disease"
-            elif "prevent" in user_message.lower():
-                topic_query = f"How to prevent {conversation_context['last_topic']} disease"
-            elif "cause" in user_message.lower():
-                topic_query = f"What causes {conversation_context['last_topic']} disease"
-            elif "way" in user_message.lower() and "treat" in user_message.lower():
-                topic_query = f"Treatment methods for {conversation_context['last_topic']}"
-            else:
-                topic_query = f"{user_message} about {conversation_context['last_topic']}"
-            
-            # Log for debugging
-            print(f"Follow-up detected. Original: '{user_message}', Using topic query: '{topic_query}'")
-            
+        # Routing embeds the message and may re-read the answer bank from disk
+        route = await asyncio.to_thread(route_message, user_message, session_id)
+        
+        if route.answer is not None:
+            response = route.answer
+        else:
             try:
-                # Use the knowledge base with the enhanced topic query
-                qa_result = qa_chain(topic_query)
-                response = qa_result["result"]
-                
-                # Add source attribution
-                source_docs = qa_result.get("source_documents", [])
-                if source_docs:
-                    sources = []
-                    for doc in source_docs:
-                        if hasattr(doc, 'metadata') and doc.metadata:
-                            source_info = f"{doc.metadata.get('source', 'Unknown source')}"
-                            if 'page' in doc.metadata:
-                                source_info += f", Page {doc.metadata['page']}"
-                            sources.append(source_info)
-                    
-                    if sources:
-                        unique_sources = list(set(sources))
-                        cleaned_sources = [clean_source_text(src) for src in unique_sources]
-                        source_text = "; ".join(cleaned_sources)
-                        response += "\n\n📚 **Sources**: " + source_text
-                else:
-                    response = f"I'm sorry, but I don't have additional information about {conversation_context['last_topic']} in my knowledge base. Would you like to ask about something else?"
+                response, has_sources = "", False
+                async for response, has_sources in stream_from_knowledge_base_async(route.query, deadline):
+                    history[-1] = (user_message, response)
+                    yield history
+                if not has_sources:
+                    response = await asyncio.to_thread(answer_without_sources, route, user_message, response, farming_agent, session_id, deadline)
             except Exception as e:
-                print(f"Error in follow-up handling: {str(e)}")
-                response = f"I'm sorry, but I don't have additional information about {conversation_context['last_topic']} in my knowledge base. Would you like to ask about something else?"
-        else:
-            # The rest of your existing code for non-follow-up questions...
-            # Extract the main topic from the user's message
-            topic = identify_topic(user_message)
-            
-            # Check if the query is likely related to farming
-            farming_topics = [
-                "plant", "crop", "soil", "disease", "pest", "irrigation", "fertilizer", 
-                "harvest", "seed", "growth", "garden", "farm", "agriculture", "cultivation",
-                "organic", "compost", "weather", "season", "yield", "nutrient", "weed"
-            ]
-            
-            is_farming_related = any(topic in user_message.lower() for topic in farming_topics)
-            
-            if not is_farming_related:
-                # Handle non-farming topics
-                non_farming_keywords = ["politics", "sports", "entertainment", "movie", "game", 
-                                    "celebrity", "stock market", "music", "travel"]
-                                    
-                if any(keyword in user_message.lower() for keyword in non_farming_keywords):
-                    response = "I'm specifically designed to help with farming and plant-related questions. For this topic, I recommend using a general-purpose assistant or a specialized tool. Can I help you with any farming or gardening questions instead?"
-                else:
-                    # Try to use the knowledge base directly
-                    try:
-                        qa_result = qa_chain(user_message)
-                        response = qa_result["result"]
-                        
-                        # Add source attribution
-                        source_docs = qa_result.get("source_documents", [])
-                        if source_docs:
-                            sources = []
-                            for doc in source_docs:
-                                if hasattr(doc, 'metadata') and doc.metadata:
-                                    source_info = f"{doc.metadata.get('source', 'Unknown source')}"
-                                    if 'page' in doc.metadata:
-                                        source_info += f", Page {doc.metadata['page']}"
-                                    sources.append(source_info)
-                            
-                            if sources:
-                                unique_sources = list(set(sources))
-                                cleaned_sources = [clean_source_text(src) for src in unique_sources]
-                                source_text = "; ".join(cleaned_sources)
-                                response += "\n\n📚 **Sources**: " + source_text
-                    except Exception:
-                        # Fall back to agent
-                        result = farming_agent.run(user_message)
-                        response = result
-            else:
-                # For farming-related queries, use the knowledge base directly to ensure data comes from Chroma DB
-                try:
-                    # Always query the knowledge base directly
-                    qa_result = qa_chain(user_message)
-                    response = qa_result["result"]
-                    
-                    # Always add source attribution
-                    source_docs = qa_result.get("source_documents", [])
-                    if source_docs:
-                        sources = []
-                        for doc in source_docs:
-                            if hasattr(doc, 'metadata') and doc.metadata:
-                                source_info = f"{doc.metadata.get('source', 'Unknown source')}"
-                                if 'page' in doc.metadata:
-                                    source_info += f", Page {doc.metadata['page']}"
-                                sources.append(source_info)
-                        
-                        if sources:
-                            unique_sources = list(set(sources))
-                            cleaned_sources = [clean_source_text(src) for src in unique_sources]
-                            source_text = "; ".join(cleaned_sources)
-                            response += "\n\n📚 **Sources**: " + source_text
-                    else:
-                        # If no source documents found, try using the agent as fallback
-                        augmented_message = user_message + " Please include only information from the knowledge base."
-                        result = farming_agent.run(augmented_message)
-                        response = result
-                except Exception as e:
-                    # If direct knowledge base query fails, use agent as fallback
-                    try:
-                        augmented_message = user_message + " Please include only information from the knowledge base with sources."
-                        result = farming_agent.run(augmented_message)
-                        response = result
-                    except Exception:
-                        response = f"I'm sorry, but I couldn't find information about this in my knowledge base. Error: {str(e)}"
-                except Exception as e:
-                    # If the agent fails, try the direct knowledge base approach
-                    try:
-                        qa_result = qa_chain(user_message)
-                        response = qa_result["result"]
-                        
-                        # Add source attribution
-                        source_docs = qa_result.get("source_documents", [])
-                        if source_docs:
-                            sources = []
-                            for doc in source_docs:
-                                if hasattr(doc, 'metadata') and doc.metadata:
-                                    source_info = f"{doc.metadata.get('source', 'Unknown source')}"
-                                    if 'page' in doc.metadata:
-                                        source_info += f", Page {doc.metadata['page']}"
-                                    sources.append(source_info)
-                            
-                            if sources:
-                                unique_sources = list(set(sources))
-                                cleaned_sources = [clean_source_text(src) for src in unique_sources]
-                                source_text = "; ".join(cleaned_sources)
-                                response += "\n\n📚 **Sources**: " + source_text
-                    except Exception:
-                        # If all else fails, provide a generic response with the original error
-                        response = f"I'm unable to process this request. There might be a technical issue with my tools or the question might be outside my expertise. Error details: {str(e)}"
-
-            # Update the conversation context if this is not a follow-up
-            if topic:
-                conversation_context["last_topic"] = topic
-
+                response = await asyncio.to_thread(answer_after_error, route, user_message, e, farming_agent, session_id, deadline)
     except Exception as e:
         # Fallback error handling
-        response = "⚠️ I encountered an error while processing your request. Let me try a more direct approach."
-        try:
-            # Try one more time with just the knowledge base
-            qa_result = qa_chain(user_message)
-            response = qa_result["result"]
-            
-            # Add source attribution
-            source_docs = qa_result.get("source_documents", [])
-            if source_docs:
-                sources = []
-                for doc in source_docs:
-                    if hasattr(doc, 'metadata') and doc.metadata:
-                        source_info = f"{doc.metadata.get('source', 'Unknown source')}"
-                        if 'page' in doc.metadata:
-                            source_info += f", Page {doc.metadata['page']}"
-                        sources.append(source_info)
-                
-                if sources:
-                    unique_sources = list(set(sources))
-                    cleaned_sources = [clean_source_text(src) for src in unique_sources]
-                    source_text = "; ".join(cleaned_sources)
-                    response += "\n\n📚 **Sources**: " + source_text
-        except Exception:
-            response = f"⚠️ I'm sorry, but I encountered an error processing your request: {str(e)}. Please try rephrasing your question or asking about a farming-related topic."
-    
-    # Update conversation history
-    conversation_context["previous_queries"].append(user_message)
-    conversation_context["previous_responses"].append(response)
-    
-    # Maintain maximum context length
-    if len(conversation_context["previous_queries"]) > MAX_CONTEXT_ITEMS:
-        conversation_context["previous_queries"] = conversation_context["previous_queries"][-MAX_CONTEXT_ITEMS:]
-        conversation_context["previous_responses"] = conversation_context["previous_responses"][-MAX_CONTEXT_ITEMS:]
-    
-    # Update GUI history
-    history.append((user_message, response))
-    return history
+        response = await asyncio.to_thread(answer_after_failure, user_message, e, qa_chain, deadline)
+    
+    await asyncio.to_thread(remember_exchange, route, user_message, response, session_id)
+    observe("chat_request", time.perf_counter() - started, route=route.kind if route else "error")
+    
+    history[-1] = (user_message, response)
+    yield history
 
-def clear_chat():
+def clear_chat(session_id=None):
     """
     Clear the chat history.
     
+    Args:
+        session_id: Gradio session whose conversation context is reset
+        
     Returns:
         list: Empty list for resetting chat history
     """
-    global conversation_context
-    
-    # Reset conversation context
-    conversation_context = {
-        "last_topic": None,
-        "previous_queries": [],
-        "previous_responses": []
-    }
+    session_store.clear(session_id)
     
-    return []
\ No newline at end of file
+    return []
@@ -0,0 +1,204 @@
+"""
+Token-budgeted prompt context for knowledge base answers.
+
+Retrieved chunks are deduplicated and packed, best first, into a fixed token
+budget, and the conversation history is condensed so that recent turns are
+kept verbatim and older ones shrink to one line each. This keeps prompts
+small enough for the 4k context chat model.
+"""
+import re
+import copy
+import hashlib
+from config import GPT_CHAT_MODEL, CONTEXT_MAX_TOKENS, CONTEXT_HISTORY_TOKENS, CONTEXT_DEDUP_THRESHOLD
+
+# Tokenizers by model name (None when tiktoken is unavailable)
+_encodings = {}
+
+def _get_encoding(model):
+    if model not in _encodings:
+        try:
+            import tiktoken
+            try:
+                _encodings[model] = tiktoken.encoding_for_model(model)
+            except KeyError:
+                _encodings[model] = tiktoken.get_encoding("cl100k_base")
+        except ImportError:
+            _encodings[model] = None
+    return _encodings[model]
+
+def count_tokens(text, model=GPT_CHAT_MODEL):
+    """
+    Count the LLM tokens in a text.
+
+    Uses tiktoken when installed and otherwise estimates ~4 characters per
+    token.
+
+    Args:
+        text: Text to count
+        model: OpenAI model whose tokenizer is used
+
+    Returns:
+        int: Number of tokens
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+def truncate_to_tokens(text, max_tokens, model=GPT_CHAT_MODEL):
+    """
+    Cut a text down to at most max_tokens tokens.
+    """
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return text[:max_tokens * 4]
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+
+def _shingles(text, size=3):
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+def dedupe_documents(documents, threshold=CONTEXT_DEDUP_THRESHOLD):
+    """
+    Drop duplicate and near-duplicate chunks, keeping the first (best ranked).
+
+    Two chunks are near-duplicates when the Jaccard similarity of their word
+    trigrams is at least `threshold`, which catches the same passage
+    extracted from overlapping chunks or from two editions of a book.
+
+    Args:
+        documents: Retrieved documents, best first
+        threshold: Similarity above which a chunk is dropped
+
+    Returns:
+        tuple: (kept documents, number of dropped documents)
+    """
+    kept, kept_shingles, seen = [], [], set()
+    for doc in documents:
+        text = " ".join(doc.page_content.split())
+        digest = hashlib.sha1(text.lower().encode("utf-8")).hexdigest()
+        if digest in seen:
+            continue
+        shingles = _shingles(text)
+        if any(len(shingles & other) / len(shingles | other) >= threshold for other in kept_shingles):
+            continue
+        seen.add(digest)
+        kept.append(doc)
+        kept_shingles.append(shingles)
+    return kept, len(documents) - len(kept)
+
+def condense_history(turns, max_tokens=CONTEXT_HISTORY_TOKENS, model=GPT_CHAT_MODEL):
+    """
+    Fit a conversation history into a token budget.
+
+    The most recent turns are kept verbatim while they fit in half the
+    budget; older turns are summarized as the question plus the first
+    sentence of the answer. The summary that reaches the budget is cut down
+    to the tokens left, and any older ones are dropped.
+
+    Args:
+        turns: List of (question, answer) pairs, oldest first
+        max_tokens: Token budget for the history
+        model: OpenAI model whose tokenizer is used
+
+    Returns:
+        str: The condensed history (oldest first)
+    """
+    lines = []
+    used = 0
+    verbatim = True
+    for question, answer in reversed(turns):
+        if verbatim:
+            line = f"User: {question}\nAssistant: {answer}"
+            tokens = count_tokens(line, model)
+            if used + tokens <= max_tokens // 2:
+                lines.append(line)
+                used += tokens
+                continue
+            verbatim = False
+
+        first_sentence = re.split(r"(?<=[.!?])\s", answer.strip(), maxsplit=1)[0]
+        line = f"- Earlier, the user asked: {question} (answer began: {first_sentence})"
+        tokens = count_tokens(line, model)
+        if used + tokens > max_tokens:
+            if max_tokens - used > 0:
+                lines.append(truncate_to_tokens(line, max_tokens - used, model))
+            break
+        lines.append(line)
+        used += tokens
+    return "\n".join(reversed(lines))
+
+def build_context(question, documents, history=(), max_tokens=CONTEXT_MAX_TOKENS,
+                  history_tokens=CONTEXT_HISTORY_TOKENS, model=GPT_CHAT_MODEL):
+    """
+    Pack retrieved chunks and conversation history into a token budget.
+
+    Args:
+        question: User question
+        documents: Retrieved documents, best first
+        history: List of (question, answer) pairs, oldest first
+        max_tokens: Budget for question, history and context together
+        history_tokens: Part of the budget the history may use
+        model: OpenAI model whose tokenizer is used
+
+    Returns:
+        dict: "context" and "chat_history" strings, the "documents" that were
+        used (a copy of the first, cut down, if it alone exceeded the budget),
+        and "stats" with the token counts and chunk counts
+    """
+    question_tokens = count_tokens(question, model)
+    chat_history = condense_history(list(history), min(history_tokens, max_tokens - question_tokens), model)
+    used_history = count_tokens(chat_history, model)
+
+    unique, duplicates = dedupe_documents(documents)
+    budget = max_tokens - question_tokens - used_history
+    separator_tokens = count_tokens("\n\n", model)
+
+    used, texts, context_tokens = [], [], 0
+    for doc in unique:
+        text = doc.page_content
+        tokens = count_tokens(text, model) + (separator_tokens if used else 0)
+        if not used and tokens > budget > 0:
+            # Never answer without context because the best chunk is too long
+            text = truncate_to_tokens(text, budget, model)
+            tokens = count_tokens(text, model)
+            doc = copy.copy(doc)
+            doc.page_content = text
+        # Skip chunks that do not fit; a later, shorter one still might
+        if context_tokens + tokens > budget:
+            continue
+        used.append(doc)
+        texts.append(text)
+        context_tokens += tokens
+
+    stats = {
+        "question_tokens": question_tokens,
+        "history_tokens": used_history,
+        "context_tokens": context_tokens,
+        "total_tokens": question_tokens + used_history + context_tokens,
+        "budget": max_tokens,
+        "documents_retrieved": len(documents),
+        "duplicates_dropped": duplicates,
+        "documents_used": len(used),
+    }
+    return {
+        "context": "\n\n".join(texts),
+        "chat_history": chat_history,
+        "documents": used,
+        "stats": stats,
+    }
+
+def format_context_stats(stats):
+    """
+    Format context builder stats as a one-line log message.
+    """
+    return (f"Prompt context: {stats['total_tokens']}/{stats['budget']} tokens "
+            f"(question {stats['question_tokens']}, history {stats['history_tokens']}, "
+            f"context {stats['context_tokens']}), {stats['documents_used']}/{stats['documents_retrieved']} "
+            f"chunks used, {stats['duplicates_dropped']} duplicates dropped")
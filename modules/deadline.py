@@ -0,0 +1,231 @@
+"""
+Request deadlines and LLM call budgets for the chat answer path.
+
+One user message can cascade through the QA chain, the agent (several tool
+calls) and a final QA retry. A Deadline is created per message and passed
+down the cascade: every LLM-backed step runs through `call_with_deadline`,
+which charges the call budget, stops waiting once the deadline passes, and
+can fire a hedged second attempt when the first one is slow. Streamed
+answers are opened with `open_hedged_stream`, which does the same for the
+first token of an async stream.
+"""
+import time
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from modules.metrics import increment
+from config import CHAT_DEADLINE, CHAT_CALL_BUDGET, CHAT_EXECUTOR_WORKERS
+
+# Threads running LLM calls on behalf of deadline-bound requests. A call that
+# misses its deadline keeps its thread until the HTTP timeout ends it, so
+# the pool is sized separately from the inference executor.
+executor = ThreadPoolExecutor(max_workers=CHAT_EXECUTOR_WORKERS, thread_name_prefix="chat-call")
+
+class DeadlineExceeded(TimeoutError):
+    """
+    Raised when a request runs out of time or LLM calls.
+    """
+
+class Deadline:
+    """
+    Time limit and LLM call budget of a single chat request.
+
+    Args:
+        seconds: Wall-clock time allowed for the request (0 for no limit)
+        max_calls: LLM-backed calls allowed, hedged attempts included
+            (0 for no limit)
+    """
+
+    def __init__(self, seconds=CHAT_DEADLINE, max_calls=CHAT_CALL_BUDGET):
+        self.seconds = seconds
+        self.max_calls = max_calls
+        self.started = time.monotonic()
+        self.calls = 0
+
+    def remaining(self):
+        """
+        Seconds left before the deadline (None if there is no time limit).
+        """
+        if not self.seconds:
+            return None
+        return max(0.0, self.started + self.seconds - time.monotonic())
+
+    @property
+    def expired(self):
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    def can_spend(self):
+        """
+        Whether another call fits in the time and call budget.
+        """
+        return not self.expired and (not self.max_calls or self.calls < self.max_calls)
+
+    def spend(self):
+        """
+        Charge one call to the budget.
+
+        Raises:
+            DeadlineExceeded: If the deadline passed or the budget is used up
+        """
+        if self.expired:
+            raise DeadlineExceeded(f"deadline of {self.seconds:g}s exceeded")
+        if self.max_calls and self.calls >= self.max_calls:
+            raise DeadlineExceeded(f"call budget of {self.max_calls} exhausted")
+        self.calls += 1
+
+def _submit(func, args, kwargs):
+    # Run with the caller's context so tracing and session variables carry over
+    context = contextvars.copy_context()
+    return executor.submit(context.run, func, *args, **kwargs)
+
+def call_with_deadline(deadline, func, *args, hedge_after=None, name="call", **kwargs):
+    """
+    Call a function within a request's deadline and call budget.
+
+    If the call is still running after `hedge_after` seconds and the budget
+    allows, an identical second attempt is started and whichever finishes
+    first wins. Only use hedging for idempotent calls.
+
+    Args:
+        deadline: Deadline of the request (None to call func directly)
+        func: Function to call
+        *args: Positional arguments for func
+        hedge_after: Seconds before a hedged attempt is fired (None: never)
+        name: Label for the deadline metrics
+        **kwargs: Keyword arguments for func
+
+    Returns:
+        object: The function's return value
+
+    Raises:
+        DeadlineExceeded: If the budget is used up or no attempt finished in time
+    """
+    if deadline is None:
+        return func(*args, **kwargs)
+
+    deadline.spend()
+    attempts = [_submit(func, args, kwargs)]
+    hedge_at = time.monotonic() + hedge_after if hedge_after is not None else None
+
+    while True:
+        remaining = deadline.remaining()
+        timeout = remaining
+        if hedge_at is not None:
+            until_hedge = max(0.0, hedge_at - time.monotonic())
+            timeout = until_hedge if timeout is None else min(timeout, until_hedge)
+
+        done, _ = wait(attempts, timeout=timeout, return_when=FIRST_COMPLETED)
+        if done:
+            # Prefer a successful attempt; re-raise only if every attempt failed
+            finished = next((f for f in done if f.exception() is None), None)
+            if finished is not None or len(done) == len(attempts):
+                for attempt in attempts:
+                    attempt.cancel()
+                if len(attempts) > 1:
+                    increment("hedged_calls", call=name, winner="hedge" if finished is attempts[-1] else "first")
+                return (finished or next(iter(done))).result()
+            attempts = [f for f in attempts if f not in done]
+            continue
+
+        if hedge_at is not None and time.monotonic() >= hedge_at:
+            hedge_at = None
+            if deadline.can_spend():
+                deadline.spend()
+                attempts.append(_submit(func, args, kwargs))
+            continue
+
+        if deadline.expired:
+            # Abandon the attempts; queued ones are cancelled, running ones
+            # end with their HTTP timeout and their results are discarded
+            for attempt in attempts:
+                attempt.cancel()
+            increment("deadline_exceeded", call=name)
+            raise DeadlineExceeded(f"{name} did not finish within the {deadline.seconds:g}s deadline")
+
+async def _close_stream(task, stream):
+    # A generator cannot be closed while a __anext__ call is still running
+    if task is not None:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+    if hasattr(stream, "aclose"):
+        try:
+            await stream.aclose()
+        except Exception:
+            pass
+
+async def open_hedged_stream(deadline, open_stream, hedge_after=None, name="stream"):
+    """
+    Open an async stream within a request's deadline, hedging a slow start.
+
+    If the stream has not produced its first item `hedge_after` seconds after
+    it was opened and the budget allows, an identical second stream is
+    opened; whichever produces its first item first is kept and the other is
+    closed. Only use hedging for idempotent streams.
+
+    Args:
+        deadline: Deadline of the request (None: no limit and no hedging)
+        open_stream: Zero-argument function returning an async iterator
+        hedge_after: Seconds before a hedged stream is opened (None: never)
+        name: Label for the deadline metrics
+
+    Returns:
+        tuple: (first item, stream of the remaining items); the first item is
+        None if the stream ended without producing anything
+
+    Raises:
+        DeadlineExceeded: If the budget is used up or no stream started in time
+    """
+    if deadline is not None:
+        deadline.spend()
+    stream = open_stream().__aiter__()
+    attempts = {asyncio.ensure_future(stream.__anext__()): stream}
+    streams = [stream]
+    hedge_at = time.monotonic() + hedge_after if hedge_after is not None and deadline is not None else None
+    winner, first, error = None, None, None
+
+    try:
+        while attempts:
+            timeout = deadline.remaining() if deadline is not None else None
+            if hedge_at is not None:
+                until_hedge = max(0.0, hedge_at - time.monotonic())
+                timeout = until_hedge if timeout is None else min(timeout, until_hedge)
+
+            done, _ = await asyncio.wait(attempts, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                stream = attempts.pop(task)
+                try:
+                    first = task.result()
+                except StopAsyncIteration:
+                    first = None
+                except Exception as e:
+                    # Keep waiting for the other attempt, if there is one
+                    error = e
+                    await _close_stream(None, stream)
+                    continue
+                winner = stream
+                break
+            if winner is not None:
+                if len(streams) > 1:
+                    increment("hedged_calls", call=name, winner="hedge" if winner is streams[-1] else "first")
+                return first, winner
+            if done:
+                continue
+
+            if hedge_at is not None and time.monotonic() >= hedge_at:
+                hedge_at = None
+                if deadline.can_spend():
+                    deadline.spend()
+                    stream = open_stream().__aiter__()
+                    attempts[asyncio.ensure_future(stream.__anext__())] = stream
+                    streams.append(stream)
+                continue
+
+            if deadline is not None and deadline.expired:
+                increment("deadline_exceeded", call=name)
+                raise DeadlineExceeded(f"{name} did not start within the {deadline.seconds:g}s deadline")
+        raise error
+    finally:
+        # Close the attempts that lost (or all of them on an error)
+        for task, stream in list(attempts.items()):
+            await _close_stream(task, stream)
@@ -1,95 +1,95 @@
 """
 Plant disease detection functionality.
 """
-import torch
 import numpy as np
-from PIL import Image
 from modules.model_loader import load_image_classification_model, load_plant_dataset, load_embeddings_model
 from modules.fruit_classifier import classify_fruit_or_vegetable
-import matplotlib.pyplot as plt
+from modules.inference import run_in_executor
+from modules.batching import create_model_batcher
+from modules.image_pipeline import analyze_image
+from modules import registry
+
+# Models and dataset are loaded on first use (or by the startup warmup)
+registry.register("disease_classifier", load_image_classification_model)
+registry.register("plant_dataset", load_plant_dataset)
+# Concurrent predictions share batched forward passes
+registry.register("disease_batcher", lambda: create_model_batcher(registry.get("disease_classifier")[1], "disease"))
+# Description lookup for every classifier label, computed once
+registry.register("disease_label_lookup", lambda: build_label_lookup(registry.get("disease_classifier")[2]))
 
-# Load models and dataset
-processor, model, class_labels = load_image_classification_model()
-descriptions, labels, description_embeddings = load_plant_dataset()
 embedder = load_embeddings_model()
 
 def plot_top_predictions(predictions):
-    labels = [label.replace('_', ' ').title() for label, _ in predictions]
-    scores = [score for _, score in predictions]
+    """
+    Build the confidence chart for ranked predictions.
 
-    fig, ax = plt.subplots(figsize=(6, 4))
-    fig.patch.set_facecolor('#0f172a')
-    ax.set_facecolor('#1e293b')
+    The chart is rendered in the browser by a gr.Label component, so no
+    figure is created (or kept alive) on the server.
 
-    bars = ax.bar(labels, scores, color=['#34D399', '#10B981', '#059669'])
+    Args:
+        predictions: Ranked (label, confidence) tuples
 
-    ax.set_ylim(0, 1)
-    ax.set_ylabel("Confidence", fontsize=12, color='white')
-    ax.set_title("Top Predictions", fontsize=14, color='white')
-    ax.tick_params(colors='white')
-    ax.spines['bottom'].set_color('white')
-    ax.spines['left'].set_color('white')
-    return fig
+    Returns:
+        dict: Display label -> confidence, best first
+    """
+    return {label.replace('_', ' ').title(): float(score) for label, score in predictions}
 
 
-def predict_image(image):
+def classify_disease(image, k=3):
     """
-    Predict plant disease from an image.
+    Run the plant disease classifier on an image.
     
     Args:
         image: Path to the image file or image object
+        k: Number of ranked predictions to return
         
     Returns:
-        tuple: (display_img, prediction, top_predictions, description, treatment)
+        list: (label, confidence) tuples, best first
     """
-    if image is None:
-        return None, "No image uploaded", "", "", ""
+    # Single reduced decode, batched forward pass, cached by image content
+    return analyze_image(image, models=("disease",), k=k)["disease"]
+
+def describe_prediction(top_predictions):
+    """
+    Build the UI outputs for a disease prediction.
     
-    try:
-        # Load and preprocess image
-        image_pil = Image.open(image).convert("RGB") if isinstance(image, str) else image.convert("RGB")
-        display_img = image_pil.copy()
-        
-        # Prepare inputs for the model
-        inputs = processor(images=image_pil, return_tensors="pt")
-        inputs = {k: v.to(model.device) for k, v in inputs.items()}
-        
-        # Make prediction
-        with torch.no_grad():
-            outputs = model(**inputs)
-        
-        # Process results
-        logits = outputs.logits
-        predicted_class_idx = logits.argmax(-1).item()
-        predicted_disease = class_labels[predicted_class_idx]
-        confidence = torch.softmax(logits, dim=1)[0][predicted_class_idx].item()
+    Args:
+        top_predictions: Ranked (label, confidence) tuples from classify_disease
         
-        # Get top 3 predictions for display
-        top_idxs = torch.topk(logits, k=3).indices[0].tolist()
-        top_predictions = [(class_labels[idx], torch.softmax(logits, dim=1)[0][idx].item()) for idx in top_idxs]
-        top_predictions_plot = plot_top_predictions(top_predictions)
+    Returns:
+        tuple: (prediction, top_predictions_plot, description, treatment)
+    """
+    predicted_disease, confidence = top_predictions[0]
+    top_predictions_plot = plot_top_predictions(top_predictions)
+    
+    # Get matching description and treatment from the precomputed table
+    match = get_label_match(predicted_disease)
+    
+    return (
+        f"**Prediction: {predicted_disease.replace('_', ' ').title()}** ({confidence:.1%})", 
+        top_predictions_plot, 
+        match["description"], 
+        match["treatment"]
+    )
 
+def predict_image(image):
+    """
+    Predict plant disease from an image.
+    
+    Args:
+        image: Path to the image file or image object
         
-        # Get matching description
-        query_embedding = embedder.encode(predicted_disease, normalize_embeddings=True)
-        similarities = np.dot(description_embeddings, query_embedding)
-        top_match_idx = np.argmax(similarities)
-        matched_label = labels[top_match_idx]
-        matched_description = descriptions[top_match_idx]
-        
-        # Generate treatment recommendations
-        treatment_recommendations = generate_treatment_tips(matched_label)
-        
-        return (
-            f"**Prediction: {predicted_disease.replace('_', ' ').title()}** ({confidence:.1%})", 
-            top_predictions_plot, 
-            matched_description, 
-            treatment_recommendations
-        )
-
+    Returns:
+        tuple: (prediction, top_predictions_plot, description, treatment)
+    """
+    if image is None:
+        return "No image uploaded", None, "", ""
     
+    try:
+        # Get top 3 predictions for display; the first one is the prediction
+        return describe_prediction(classify_disease(image, k=3))
     except Exception as e:
-        return None, f"⚠️ Error processing image: {str(e)}", "", "", ""
+        return f"⚠️ Error processing image: {str(e)}", None, "", ""
 
 def generate_treatment_tips(disease_name):
     """
@@ -118,6 +118,58 @@ def generate_treatment_tips(disease_name):
     
     return common_tips.get(disease_name.lower(), default_tips)
 
+def match_description(label):
+    """
+    Find the dataset description closest to a label by embedding similarity.
+    
+    Args:
+        label: Disease label to look up
+        
+    Returns:
+        dict: {"matched_label", "description", "treatment"} for the best match
+    """
+    descriptions, labels, description_embeddings = registry.get("plant_dataset")
+    query_embedding = embedder.encode(label, normalize_embeddings=True)
+    similarities = np.dot(description_embeddings, query_embedding)
+    top_match_idx = int(np.argmax(similarities))
+    matched_label = labels[top_match_idx]
+    
+    return {
+        "matched_label": matched_label,
+        "description": descriptions[top_match_idx],
+        "treatment": generate_treatment_tips(matched_label)
+    }
+
+def build_label_lookup(class_labels):
+    """
+    Precompute description matches for every label the classifier can emit.
+    
+    Args:
+        class_labels: Mapping of class index to label (model.config.id2label)
+        
+    Returns:
+        dict: Mapping of label to its match_description result
+    """
+    return {label: match_description(label) for label in class_labels.values()}
+
+def get_label_match(label):
+    """
+    Get the description match for a predicted label.
+    
+    Known classifier labels are served from the precomputed table; only
+    unknown labels fall back to a similarity search.
+    
+    Args:
+        label: Predicted disease label
+        
+    Returns:
+        dict: {"matched_label", "description", "treatment"} for the label
+    """
+    match = registry.get("disease_label_lookup").get(label)
+    if match is None:
+        match = match_description(label)
+    return match
+
 def analyze_uploaded_plant_image(image_path):
     if not image_path:
         return None
@@ -127,3 +179,9 @@ def analyze_uploaded_plant_image(image_path):
         return predicted_label
     except Exception as e:
         return f"⚠️ Error: {str(e)}"
+
+async def analyze_uploaded_plant_image_async(image_path):
+    """
+    Classify an uploaded fruit/vegetable image without blocking the event loop.
+    """
+    return await run_in_executor(analyze_uploaded_plant_image, image_path)
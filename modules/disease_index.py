@@ -0,0 +1,118 @@
+"""
+Versioned binary file of precomputed disease description embeddings.
+
+Layout:
+    4 bytes   magic b"ZDIX"
+    4 bytes   little-endian uint32 header length
+    N bytes   UTF-8 JSON header (format version, dtype, shape, model name,
+              data offset, labels and descriptions)
+    padding   up to a 64-byte boundary
+    data      row-major (count, dim) embedding matrix
+
+The embedding matrix is opened with np.memmap, so loading is near-instant and
+several server processes share the same page-cache pages.
+"""
+import os
+import json
+import struct
+import numpy as np
+
+MAGIC = b"ZDIX"
+FORMAT_VERSION = 1
+SUPPORTED_DTYPES = ("float16", "float32")
+_ALIGNMENT = 64
+
+def write_disease_index(path, descriptions, labels, embeddings, dtype="float16", model_name=None):
+    """
+    Write descriptions, labels and embeddings to a disease index file.
+
+    Args:
+        path: Output file path
+        descriptions: List of disease descriptions
+        labels: List of disease labels (same length as descriptions)
+        embeddings: (count, dim) array of description embeddings
+        dtype: Storage dtype, "float16" or "float32"
+        model_name: Name of the embedding model that produced the vectors
+    """
+    if dtype not in SUPPORTED_DTYPES:
+        raise ValueError(f"Unsupported dtype {dtype!r}, expected one of {SUPPORTED_DTYPES}")
+
+    embeddings = np.ascontiguousarray(embeddings, dtype=dtype)
+    if embeddings.ndim != 2 or len(embeddings) != len(descriptions) or len(labels) != len(descriptions):
+        raise ValueError("descriptions, labels and embeddings must have matching lengths")
+
+    header = {
+        "format_version": FORMAT_VERSION,
+        "dtype": dtype,
+        "count": int(embeddings.shape[0]),
+        "dim": int(embeddings.shape[1]),
+        "embedding_model": model_name,
+        "labels": list(labels),
+        "descriptions": list(descriptions),
+    }
+
+    # Reserve some slack so the header still fits once the real data offset
+    # (which depends on the header length) is filled in
+    header["data_offset"] = 0
+    header_bytes = json.dumps(header).encode("utf-8")
+    data_offset = _align(len(MAGIC) + 4 + len(header_bytes) + 16)
+    header["data_offset"] = data_offset
+    header_bytes = json.dumps(header).encode("utf-8")
+    header_bytes += b" " * (data_offset - len(MAGIC) - 4 - len(header_bytes))
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(header_bytes)))
+        f.write(header_bytes)
+        f.write(embeddings.tobytes())
+    os.replace(tmp_path, path)
+
+def read_disease_index_header(path):
+    """
+    Read and validate the header of a disease index file.
+
+    Args:
+        path: Path to the index file
+
+    Returns:
+        dict: Parsed header
+    """
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a disease index file")
+        (header_length,) = struct.unpack("<I", f.read(4))
+        header = json.loads(f.read(header_length).decode("utf-8"))
+
+    if header.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported disease index version {header.get('format_version')} in {path}")
+    return header
+
+def load_disease_index(path, expected_model=None):
+    """
+    Open a disease index file with the embeddings memory-mapped.
+
+    Args:
+        path: Path to the index file
+        expected_model: If given, reject files built with another embedding model
+
+    Returns:
+        tuple: (descriptions, labels, embeddings) where embeddings is a
+        read-only np.memmap of shape (count, dim)
+    """
+    header = read_disease_index_header(path)
+    if expected_model and header.get("embedding_model") != expected_model:
+        raise ValueError(f"{path} was built with {header.get('embedding_model')}, expected {expected_model}")
+
+    embeddings = np.memmap(
+        path,
+        dtype=header["dtype"],
+        mode="r",
+        offset=header["data_offset"],
+        shape=(header["count"], header["dim"])
+    )
+    return header["descriptions"], header["labels"], embeddings
+
+def _align(offset):
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
@@ -0,0 +1,234 @@
+"""
+Shared sentence embedding service.
+
+A single MiniLM model instance is used by the whole application (knowledge
+base ingest/retrieval and disease description lookup). Document vectors are
+cached on disk keyed by a hash of the model name and text, so a corpus that
+was already embedded is never encoded again. Query vectors (user messages,
+one-off lookups) are only kept in a bounded in-memory LRU, so free-form user
+text does not grow the disk cache.
+"""
+import os
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from modules.metrics import span, increment
+from config import (
+    EMBEDDING_MODEL, EMBEDDING_BATCH_SIZE, EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_ENABLED, EMBEDDING_CACHE_MAX_ROWS,
+    EMBEDDING_QUERY_CACHE_SIZE, DEVICE
+)
+
+class EmbeddingCache:
+    """
+    On-disk (SQLite) store of embedding vectors keyed by content hash.
+
+    Args:
+        path: SQLite database file
+        max_rows: Maximum number of stored vectors; the least recently
+            written are evicted beyond it (0 for no limit)
+    """
+
+    def __init__(self, path, max_rows=EMBEDDING_CACHE_MAX_ROWS):
+        self.max_rows = max_rows
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS vectors (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self._conn.commit()
+
+    def get_many(self, keys):
+        """
+        Look up vectors for the given keys.
+
+        Returns:
+            dict: Mapping of key to float32 vector for the keys that were found
+        """
+        found = {}
+        with self._lock:
+            # Stay below SQLite's bound-parameter limit
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM vectors WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, items):
+        """
+        Store (key, vector) pairs.
+        """
+        rows = [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items]
+        with self._lock:
+            # REPLACE gives rewritten rows a new rowid, so rowid order is write order
+            self._conn.executemany("INSERT OR REPLACE INTO vectors (key, vector) VALUES (?, ?)", rows)
+            if self.max_rows:
+                excess = self._conn.execute("SELECT COUNT(*) FROM vectors").fetchone()[0] - self.max_rows
+                if excess > 0:
+                    self._conn.execute(
+                        "DELETE FROM vectors WHERE rowid IN (SELECT rowid FROM vectors ORDER BY rowid LIMIT ?)",
+                        (excess,)
+                    )
+            self._conn.commit()
+
+class QueryCache:
+    """
+    In-memory LRU of embedding vectors keyed by content hash.
+
+    Args:
+        max_entries: Maximum number of cached vectors
+    """
+
+    def __init__(self, max_entries=EMBEDDING_QUERY_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        """
+        Look up vectors for the given keys.
+
+        Returns:
+            dict: Mapping of key to float32 vector for the keys that were found
+        """
+        found = {}
+        with self._lock:
+            for key in keys:
+                vector = self._entries.get(key)
+                if vector is not None:
+                    self._entries.move_to_end(key)
+                    found[key] = vector
+        return found
+
+    def put_many(self, items):
+        """
+        Store (key, vector) pairs.
+        """
+        with self._lock:
+            for key, vector in items:
+                self._entries[key] = vector
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+class EmbeddingService(Embeddings):
+    """
+    Batched, cached sentence embeddings backed by one SentenceTransformer.
+
+    Implements the LangChain Embeddings interface so it can be handed to the
+    vector store directly, and exposes `encode` for numpy callers. Lists of
+    texts (documents) are cached on disk, single texts (queries) in memory.
+    """
+
+    def __init__(self, model_name=EMBEDDING_MODEL, batch_size=EMBEDDING_BATCH_SIZE,
+                 cache_path=EMBEDDING_CACHE_PATH if EMBEDDING_CACHE_ENABLED else None, device=DEVICE):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.device = device
+        self.cache = EmbeddingCache(cache_path) if cache_path else None
+        self.query_cache = QueryCache()
+        self.stats = {"cache_hits": 0, "cache_misses": 0}
+        self._model = None
+        self._model_lock = threading.Lock()
+
+    @property
+    def model(self):
+        """
+        The underlying SentenceTransformer, loaded on first cache miss.
+        """
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer
+                    self._model = SentenceTransformer(self.model_name, device=self.device)
+        return self._model
+
+    def _cache_key(self, text, normalize_embeddings):
+        payload = f"{self.model_name}\0{int(normalize_embeddings)}\0{text}".encode("utf-8")
+        return hashlib.sha256(payload).hexdigest()
+
+    def encode(self, texts, normalize_embeddings=True, persist=None):
+        """
+        Embed one text or a list of texts.
+
+        Args:
+            texts: A string or list of strings
+            normalize_embeddings: Whether to L2-normalize the vectors
+            persist: Whether to cache the vectors on disk rather than in
+                memory (default: True for a list, False for a string)
+
+        Returns:
+            np.ndarray: 1-D vector for a string input, (n, dim) matrix otherwise
+        """
+        single = isinstance(texts, str)
+        persist = not single if persist is None else persist
+        cache = self.cache if persist else self.query_cache
+        texts = [texts] if single else list(texts)
+        if not texts:
+            return np.zeros((0, self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+
+        keys = [self._cache_key(text, normalize_embeddings) for text in texts]
+        cached = cache.get_many(list(set(keys))) if cache else {}
+
+        # Encode each distinct missing text once
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached:
+                missing.setdefault(key, text)
+
+        hits = len(texts) - sum(1 for key in keys if key in missing)
+        self.stats["cache_hits"] += hits
+        self.stats["cache_misses"] += len(missing)
+        increment("embedding_cache_lookups", hits, result="hit")
+        increment("embedding_cache_lookups", len(missing), result="miss")
+
+        if missing:
+            with span("embedding"):
+                vectors = self.model.encode(
+                    list(missing.values()),
+                    batch_size=self.batch_size,
+                    normalize_embeddings=normalize_embeddings,
+                    convert_to_numpy=True
+                ).astype(np.float32)
+            computed = dict(zip(missing.keys(), vectors))
+            if cache:
+                cache.put_many(computed.items())
+            cached.update(computed)
+
+        embeddings = np.stack([cached[key] for key in keys])
+        return embeddings[0] if single else embeddings
+
+    def embed_documents(self, texts):
+        """
+        Embed a list of documents (LangChain interface).
+        """
+        return self.encode(texts).tolist()
+
+    def embed_query(self, text):
+        """
+        Embed a single query (LangChain interface).
+        """
+        return self.encode(text).tolist()
+
+_service = None
+_service_lock = threading.Lock()
+
+def get_embedding_service():
+    """
+    Get the process-wide embedding service.
+
+    Returns:
+        EmbeddingService: The shared embedding service
+    """
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = EmbeddingService()
+    return _service
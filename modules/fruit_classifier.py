@@ -1,13 +1,13 @@
-from transformers import AutoImageProcessor, AutoModelForImageClassification
-from PIL import Image
-import torch
+from modules.model_loader import load_image_classification_model
+from modules.batching import create_model_batcher
+from modules.image_pipeline import analyze_image
+from modules import registry
+from config import MODEL_FRUIT_CLASSIFIER
 
-# Load model and processor once
-processor = AutoImageProcessor.from_pretrained("jazzmacedo/fruits-and-vegetables-detector-36")
-model = AutoModelForImageClassification.from_pretrained("jazzmacedo/fruits-and-vegetables-detector-36")
-model.eval()
-
-class_labels = model.config.id2label
+# Load model and processor on first use (or by the startup warmup)
+registry.register("fruit_classifier", lambda: load_image_classification_model(MODEL_FRUIT_CLASSIFIER))
+# Concurrent classifications share batched forward passes
+registry.register("fruit_batcher", lambda: create_model_batcher(registry.get("fruit_classifier")[1], "fruit"))
 
 def classify_fruit_or_vegetable(image_path):
     """
@@ -19,14 +19,7 @@ def classify_fruit_or_vegetable(image_path):
     Returns:
         str: Predicted label (e.g., Apple, Carrot, etc.)
     """
-    image = Image.open(image_path).convert("RGB")
-    inputs = processor(images=image, return_tensors="pt").to(model.device)
-
-    with torch.no_grad():
-        outputs = model(**inputs)
-
-    logits = outputs.logits
-    predicted_class_idx = logits.argmax(-1).item()
-    predicted_label = class_labels[predicted_class_idx]
+    # Single reduced decode, batched forward pass, cached by image content
+    predicted_label, _ = analyze_image(image_path, models=("fruit",), k=1)["fruit"][0]
 
     return predicted_label
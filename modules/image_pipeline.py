@@ -0,0 +1,147 @@
+"""
+Shared decode-once image pipeline for the ViT classifiers.
+
+An image is decoded a single time, already reduced towards the 224px the
+models use (JPEG files are decoded at 1/2, 1/4 or 1/8 scale by libjpeg's
+draft mode, so a 12 MP phone photo never has to be decoded in full), then
+preprocessed once per distinct processor configuration and run through every
+requested model. Results are cached by image content (see prediction_cache).
+"""
+from PIL import Image
+from modules.prediction_cache import prediction_cache, content_key, dhash
+from modules.inference import top_k_predictions
+from modules.metrics import span
+from modules import registry
+from config import IMAGE_DECODE_SIZE
+
+AVAILABLE_MODELS = ("disease", "fruit")
+
+# Processor configuration per processor object, used to share tensors
+# between models that preprocess identically
+_processor_configs = {}
+
+def decode_image(image, size=IMAGE_DECODE_SIZE):
+    """
+    Decode an image to RGB, reduced to no less than size pixels per side.
+
+    Args:
+        image: Path to an image file or PIL image
+        size: Smallest side the models need (0 to decode at full size)
+
+    Returns:
+        PIL.Image.Image: The RGB image
+    """
+    if isinstance(image, str):
+        with Image.open(image) as source:
+            if size and source.format == "JPEG":
+                # Decode at a reduced DCT scale that still covers size x size
+                source.draft("RGB", (size, size))
+            image = source.convert("RGB")
+    else:
+        image = image.convert("RGB")
+
+    # Box-downsample what draft mode could not (PNG, other formats, in-memory images)
+    factor = min(image.size) // size if size else 1
+    if factor >= 2:
+        image = image.reduce(factor)
+    return image
+
+def get_model(name):
+    """
+    Get the (processor, model, class_labels) and batcher of a named classifier.
+
+    Args:
+        name: "disease" for the bean disease model, "fruit" for the
+            fruit/vegetable model
+
+    Returns:
+        tuple: ((processor, model, class_labels), MicroBatcher)
+    """
+    # Imported here because the classifier modules use this pipeline
+    if name == "disease":
+        import modules.disease_detector  # registers the model
+    elif name == "fruit":
+        import modules.fruit_classifier  # registers the model
+    else:
+        raise ValueError(f"Unknown model {name!r}, expected one of {AVAILABLE_MODELS}")
+    return registry.get(f"{name}_classifier"), registry.get(f"{name}_batcher")
+
+def _processor_config(processor):
+    key = id(processor)
+    if key not in _processor_configs:
+        _processor_configs[key] = processor.to_json_string()
+    return _processor_configs[key]
+
+def preprocess(image, processors):
+    """
+    Turn a decoded image into pixel values for several models.
+
+    Models whose processors are configured identically share one tensor.
+
+    Args:
+        image: Decoded RGB PIL image
+        processors: Mapping of model name to image processor
+
+    Returns:
+        dict: Model name -> (channels, height, width) pixel values
+    """
+    tensors, by_config = {}, {}
+    for name, processor in processors.items():
+        config = _processor_config(processor)
+        if config not in by_config:
+            by_config[config] = processor(images=image, return_tensors="pt")["pixel_values"][0]
+        tensors[name] = by_config[config]
+    return tensors
+
+def analyze_image(image, models=AVAILABLE_MODELS, k=3):
+    """
+    Classify an image with several models, decoding it at most once.
+
+    Cached predictions are reused; the remaining models' forward passes are
+    submitted to their batchers together and run concurrently.
+
+    Args:
+        image: Path to an image file or PIL image
+        models: Names of the models to run (see AVAILABLE_MODELS)
+        k: Number of ranked predictions per model
+
+    Returns:
+        dict: Model name -> list of (label, confidence) tuples, best first
+    """
+    components = {name: get_model(name) for name in models}
+    key = content_key(image) if prediction_cache.enabled else None
+
+    logits = {}
+    for name in models:
+        cached = prediction_cache.get(name, key)
+        if cached is not None:
+            logits[name] = cached
+
+    missing = [name for name in models if name not in logits]
+    if missing:
+        with span("image_decode"):
+            image_pil = decode_image(image)
+
+        image_hash = dhash(image_pil) if prediction_cache.enabled and prediction_cache.dhash_distance else None
+        if image_hash is not None:
+            for name in missing:
+                cached = prediction_cache.get_near(name, image_hash)
+                if cached is not None:
+                    logits[name] = cached
+            missing = [name for name in missing if name not in logits]
+
+    if missing:
+        with span("image_preprocess"):
+            pixel_values = preprocess(image_pil, {name: components[name][0][0] for name in missing})
+
+        # Batched with concurrent requests; the models run in parallel
+        with span("image_inference", model="+".join(missing)):
+            futures = {name: components[name][1].submit(pixel_values[name]) for name in missing}
+            for name, future in futures.items():
+                logits[name] = future.result().unsqueeze(0)
+                prediction_cache.put(name, key, logits[name], image_hash)
+
+    return {
+        name: top_k_predictions(logits[name], components[name][0][2], k=k)[0]
+        for name in models
+    }
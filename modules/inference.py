@@ -0,0 +1,59 @@
+"""
+Shared helpers for running the ViT image classifiers.
+"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+import torch
+from config import INFERENCE_EXECUTOR_WORKERS
+
+# Threads that run blocking model work for async request handlers
+executor = ThreadPoolExecutor(max_workers=INFERENCE_EXECUTOR_WORKERS, thread_name_prefix="inference")
+
+def forward_logits(model, pixel_values):
+    """
+    Run a batched forward pass of an image classification model.
+
+    Args:
+        model: Image classification model
+        pixel_values: (batch, channels, height, width) tensor
+
+    Returns:
+        torch.Tensor: (batch, num_labels) logits
+    """
+    with torch.no_grad():
+        return model(pixel_values=pixel_values.to(model.device)).logits
+
+def top_k_predictions(logits, class_labels, k=3):
+    """
+    Convert a batch of logits into ranked (label, confidence) lists.
+
+    Args:
+        logits: (batch, num_labels) logits tensor
+        class_labels: Mapping of class index to label
+        k: Number of predictions to keep per image
+
+    Returns:
+        list: One list of (label, confidence) tuples per image, best first
+    """
+    probabilities = torch.softmax(logits.float(), dim=-1)
+    scores, indices = torch.topk(probabilities, k=min(k, probabilities.shape[-1]), dim=-1)
+    return [
+        [(class_labels[idx], score) for idx, score in zip(row_indices, row_scores)]
+        for row_indices, row_scores in zip(indices.tolist(), scores.tolist())
+    ]
+
+async def run_in_executor(func, *args, **kwargs):
+    """
+    Run a blocking function on the inference thread pool.
+
+    Args:
+        func: Function to call
+        *args: Positional arguments for func
+        **kwargs: Keyword arguments for func
+
+    Returns:
+        object: The function's return value
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
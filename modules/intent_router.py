@@ -0,0 +1,88 @@
+"""
+Local intent classification for chat messages.
+
+Each intent is represented by the centroid of the MiniLM embeddings of its
+labeled examples (data/intent_examples.json). A message is embedded once and
+scored against every centroid with a single matrix product, so routing takes
+about a millisecond after the embedding and never calls the LLM.
+"""
+import json
+import numpy as np
+from modules.embeddings import get_embedding_service
+from modules.response_cache import normalize_query
+from modules.metrics import increment
+from config import INTENT_EXAMPLES_PATH, INTENT_MIN_SCORE
+
+# Intents whose name starts with this prefix refer back to the last topic
+FOLLOW_UP_PREFIX = "follow_up_"
+
+class IntentRouter:
+    """
+    Nearest-centroid classifier over labeled example messages.
+
+    Args:
+        examples: Mapping of intent name to example messages
+        embedder: Object with an encode(texts, normalize_embeddings=True) method
+        min_score: Minimum cosine similarity to the best centroid; weaker
+            matches are classified as "general"
+    """
+
+    def __init__(self, examples, embedder=None, min_score=INTENT_MIN_SCORE):
+        self.embedder = embedder or get_embedding_service()
+        self.min_score = min_score
+        self.intents = list(examples)
+
+        # Messages are normalized the same way as response cache keys, so a
+        # routed message's embedding is reused by the cache lookup
+        texts, owners = [], []
+        for index, intent in enumerate(self.intents):
+            texts.extend(normalize_query(text) for text in examples[intent])
+            owners.extend([index] * len(examples[intent]))
+        vectors = np.asarray(self.embedder.encode(texts, normalize_embeddings=True), dtype=np.float32)
+
+        owners = np.asarray(owners)
+        centroids = np.stack([vectors[owners == index].mean(axis=0) for index in range(len(self.intents))])
+        self.centroids = centroids / np.linalg.norm(centroids, axis=1, keepdims=True)
+
+    def classify(self, message):
+        """
+        Classify a message.
+
+        Args:
+            message: User message
+
+        Returns:
+            tuple: (intent, score), with intent "general" when no centroid
+            is similar enough
+        """
+        embedding = np.asarray(self.embedder.encode(normalize_query(message), normalize_embeddings=True),
+                               dtype=np.float32)
+        scores = self.centroids @ embedding
+        best = int(np.argmax(scores))
+        score = float(scores[best])
+
+        intent = self.intents[best] if score >= self.min_score else "general"
+        increment("intent_routes", intent=intent)
+        return intent, score
+
+def load_intent_examples(path=INTENT_EXAMPLES_PATH):
+    """
+    Load the labeled intent examples.
+
+    Args:
+        path: JSON file with an "intents" mapping
+
+    Returns:
+        dict: Mapping of intent name to example messages
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["intents"]
+
+def create_intent_router():
+    """
+    Build the intent router from the configured examples.
+
+    Returns:
+        IntentRouter: The router
+    """
+    return IntentRouter(load_intent_examples())
@@ -3,27 +3,82 @@ Knowledge base setup and document processing functionality.
 """
 import os
 import glob
-import fitz  # PyMuPDF
+import json
+import hashlib
 from tqdm import tqdm
 import chromadb
 from langchain.schema import Document
 from langchain.vectorstores import Chroma
-from langchain.embeddings import HuggingFaceEmbeddings
-from config import EMBEDDING_MODEL, CHROMA_COLLECTION_NAME, BOOKS_DIR, CHUNK_SIZE, CHUNK_OVERLAP
+from config import (
+    CHROMA_COLLECTION_NAME, BOOKS_DIR, CHUNK_SIZE, CHUNK_OVERLAP,
+    CHROMA_PERSIST_DIR, CHROMA_MANIFEST_PATH, INGEST_WORKERS, RETRIEVAL_MODE, RETRIEVAL_K, BM25_INDEX_PATH
+)
+from modules.pdf_extraction import iter_extracted_pdfs
+from modules.embeddings import get_embedding_service
+from modules.bm25_index import BM25Index
+from modules.retrieval import HybridRetriever, create_reranker
+from modules import registry
 
-# Initialize embedding function
-embedding_func = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
+# Use the shared, cached embedding service
+embedding_func = get_embedding_service()
 
-# Initialize Chroma client
-chroma_client = chromadb.Client()
+def create_chroma_client():
+    """
+    Open the persistent Chroma client (the index survives restarts).
+    
+    Returns:
+        chromadb.PersistentClient: The client
+    """
+    os.makedirs(CHROMA_PERSIST_DIR, exist_ok=True)
+    return chromadb.PersistentClient(path=CHROMA_PERSIST_DIR)
+
+registry.register("chroma_client", create_chroma_client)
+registry.register("bm25_index", lambda: BM25Index(BM25_INDEX_PATH))
+registry.register("reranker", create_reranker)
+
+def backfill_bm25_index(collection, bm25_index, batch_size=1000):
+    """
+    Build the BM25 index from an existing Chroma collection.
+    
+    Used for indexes created before keyword search was added, so they do not
+    need a full rebuild.
+    
+    Args:
+        collection: Chroma collection
+        bm25_index: Empty BM25Index to fill
+        batch_size: Chunks read from Chroma at a time
+    """
+    total = collection.count()
+    print(f"Building the BM25 index from {total} stored chunks...")
+    for offset in range(0, total, batch_size):
+        batch = collection.get(include=["documents", "metadatas"], limit=batch_size, offset=offset)
+        bm25_index.add(zip(batch["ids"], batch["documents"], batch["metadatas"]))
+
+def clear_collection(collection, batch_size=5000):
+    """
+    Delete every chunk from a Chroma collection, keeping the collection itself.
+    
+    Args:
+        collection: Chroma collection
+        batch_size: Chunks deleted at a time
+    """
+    ids = collection.get(include=[])["ids"]
+    for i in range(0, len(ids), batch_size):
+        collection.delete(ids=ids[i:i + batch_size])
 
 def setup_vector_store():
     """
     Setup and return the vector store.
     
+    With RETRIEVAL_MODE "hybrid" the retriever fuses dense search with the
+    BM25 keyword index (and re-ranks if enabled); otherwise it is plain
+    dense top-k.
+    
     Returns:
         tuple: (collection, vectorstore, retriever) tuple
     """
+    chroma_client = registry.get("chroma_client")
+    
     # Create or get collection
     collection = chroma_client.get_or_create_collection(CHROMA_COLLECTION_NAME)
     
@@ -35,86 +90,265 @@ def setup_vector_store():
     )
     
     # Initialize retriever
-    retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
+    if RETRIEVAL_MODE != "hybrid":
+        return collection, vectorstore, vectorstore.as_retriever(search_kwargs={"k": RETRIEVAL_K})
+    
+    bm25_index = registry.get("bm25_index")
+    if not len(bm25_index) and collection.count():
+        backfill_bm25_index(collection, bm25_index)
+    
+    retriever = HybridRetriever(
+        vectorstore=vectorstore,
+        bm25_index=bm25_index,
+        k=RETRIEVAL_K,
+        reranker=registry.get("reranker")
+    )
     
     return collection, vectorstore, retriever
 
-def prepare_chroma_from_local_pdfs(folder_path=BOOKS_DIR, chunk_size=CHUNK_SIZE, progress=None):
+def load_manifest(manifest_path=CHROMA_MANIFEST_PATH):
+    """
+    Load the manifest describing which PDFs are stored in the index.
+    
+    Args:
+        manifest_path: Path to the manifest JSON file
+    
+    Returns:
+        dict: Manifest with "version", "chunk_size", "chunk_overlap" and "files" keys
+    """
+    empty = {"version": 0, "chunk_size": None, "chunk_overlap": None, "files": {}}
+    if not os.path.exists(manifest_path):
+        return empty
+    
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Error reading index manifest, rebuilding: {str(e)}")
+        return empty
+    
+    for key, value in empty.items():
+        manifest.setdefault(key, value)
+    return manifest
+
+def save_manifest(manifest, manifest_path=CHROMA_MANIFEST_PATH):
+    """
+    Atomically write the index manifest to disk.
+    
+    Args:
+        manifest: Manifest dictionary
+        manifest_path: Path to the manifest JSON file
+    """
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+def get_index_version(manifest_path=CHROMA_MANIFEST_PATH):
+    """
+    Get the current version of the knowledge base index.
+    
+    The version is bumped every time PDFs are added, changed or removed, so it
+    can be used to invalidate anything derived from the index contents.
+    
+    Returns:
+        int: Index version (0 if the index has never been built)
+    """
+    return load_manifest(manifest_path)["version"]
+
+def file_sha256(path, block_size=1 << 20):
     """
-    Process PDF files and add them to the vector store.
+    Compute the SHA-256 hash of a file.
+    
+    Args:
+        path: Path to the file
+        block_size: Read block size in bytes
+    
+    Returns:
+        str: Hex digest of the file contents
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def scan_pdf_changes(pdf_paths, manifest):
+    """
+    Compare the PDFs on disk against the manifest.
+    
+    Files whose size and modification time are unchanged are trusted without
+    hashing; otherwise the content hash decides whether they really changed.
+    
+    Args:
+        pdf_paths: List of PDF file paths on disk
+        manifest: Current index manifest
+    
+    Returns:
+        tuple: (to_process, removed, touched) where to_process is a list of
+        (pdf_path, file_info) pairs that must be (re)indexed, removed is a list
+        of filenames no longer on disk and touched maps filenames to updated
+        file info for files whose content did not change
+    """
+    known_files = manifest["files"]
+    to_process, touched = [], {}
+    on_disk = set()
+    
+    for pdf_path in pdf_paths:
+        filename = os.path.basename(pdf_path)
+        on_disk.add(filename)
+        stat = os.stat(pdf_path)
+        previous = known_files.get(filename)
+        
+        if previous and previous["size"] == stat.st_size and previous["mtime"] == stat.st_mtime:
+            continue
+        
+        file_info = {"size": stat.st_size, "mtime": stat.st_mtime, "sha256": file_sha256(pdf_path)}
+        if previous and previous["sha256"] == file_info["sha256"]:
+            touched[filename] = dict(previous, **file_info)
+        else:
+            to_process.append((pdf_path, file_info))
+    
+    removed = [filename for filename in known_files if filename not in on_disk]
+    return to_process, removed, touched
+
+def record_failed_pdf(manifest, filename, file_info, error):
+    """
+    Record a PDF that could not be indexed, and save the manifest.
+    
+    The file is stored with its hash and no chunks, so it is skipped until
+    it changes on disk (or the index is rebuilt) instead of being retried,
+    and bumping the index version, on every sync.
+    
+    Args:
+        manifest: Index manifest
+        filename: Name of the PDF file
+        file_info: Size, mtime and sha256 of the file
+        error: Error message
+    """
+    manifest["files"][filename] = dict(file_info, chunks=0, pages=0, error=error)
+    save_manifest(manifest)
+
+def prepare_chroma_from_local_pdfs(folder_path=BOOKS_DIR, chunk_size=CHUNK_SIZE, rebuild=False, workers=INGEST_WORKERS):
+    """
+    Incrementally sync PDF files into the persistent vector store.
+    
+    Only PDFs that were added or changed since the last run are parsed and
+    embedded; chunks of changed or removed PDFs are deleted from the index.
+    PDFs are parsed in worker processes and streamed into the embedding
+    stage one file at a time.
     
     Args:
         folder_path: Path to the folder containing PDF files
         chunk_size: Size of text chunks for processing
-        progress: Gradio progress bar object
-        
+        rebuild: Drop the existing index and re-process every PDF
+        workers: Number of PDF extraction processes
+    
     Returns:
         str: Status message
     """
     # Find PDF files
-    pdf_paths = glob.glob(f"{folder_path}/*.pdf")
+    pdf_paths = sorted(glob.glob(f"{folder_path}/*.pdf"))
     if not pdf_paths:
         return f"⚠️ No PDF files found in: {folder_path}"
     
-    # Get collection and vector store
+    manifest = load_manifest()
+    
+    # A different chunking configuration invalidates every stored chunk
+    if manifest["files"] and (manifest["chunk_size"], manifest["chunk_overlap"]) != (chunk_size, CHUNK_OVERLAP):
+        print("Chunking settings changed, rebuilding the knowledge base index...")
+        rebuild = True
+    
+    # Whether stored chunks were removed (the index version must change)
+    index_changed = False
+    if rebuild:
+        index_changed = any(info.get("chunks") for info in manifest["files"].values())
+        # Cleared in place: dropping the collection would leave the cached
+        # retriever and QA chain pointing at a deleted collection
+        clear_collection(registry.get("chroma_client").get_or_create_collection(CHROMA_COLLECTION_NAME))
+        registry.get("bm25_index").clear()
+        manifest["files"] = {}
+    
+    manifest["chunk_size"] = chunk_size
+    manifest["chunk_overlap"] = CHUNK_OVERLAP
+    
+    # Get collection and vector store (the BM25 index is kept in step with it)
     collection, vectorstore, _ = setup_vector_store()
+    bm25_index = registry.get("bm25_index")
     
-    # Clear existing collection to avoid duplicates
-    try:
-        collection.delete(where={})
-    except Exception:
-        pass
+    to_process, removed, touched = scan_pdf_changes(pdf_paths, manifest)
+    manifest["files"].update(touched)
     
-    # Process PDF files
-    all_documents = []
-    print("Processing PDFs...")
+    if not to_process and not removed:
+        if touched:
+            save_manifest(manifest)
+        return f"✅ Knowledge base is up to date ({len(manifest['files'])} PDF files, index version {manifest['version']})"
     
-    # Use tqdm for progress tracking
-    for pdf_path in tqdm(pdf_paths, desc="Processing PDFs"):
-        filename = os.path.basename(pdf_path)
-        
+    # Remove chunks of deleted or modified files (and leftovers of new files
+    # from an interrupted build)
+    for filename in removed + [os.path.basename(path) for path, _ in to_process]:
         try:
-            # Open PDF file
-            doc = fitz.open(pdf_path)
-            
-            # Process each page
-            for page_num, page in enumerate(doc):
-                text = page.get_text()
-                if not text.strip():
-                    continue
-                
-                # Split into smaller chunks with overlap
-                words = text.split()
-                chunks = [" ".join(words[i:i + chunk_size]) for i in range(0, len(words), chunk_size - CHUNK_OVERLAP)]
-                
-                # Process each chunk
-                for i, chunk_text in enumerate(chunks):
-                    if not chunk_text.strip():
-                        continue
-                    
-                    # Create document with metadata
-                    document = Document(
-                        page_content=chunk_text,
-                        metadata={
-                            "source": filename,
-                            "page": page_num + 1,
-                            "chunk": i
-                        }
-                    )
-                    all_documents.append(document)
-            
+            collection.delete(where={"source": filename})
+            bm25_index.delete_source(filename)
         except Exception as e:
-            print(f"Error processing {filename}: {str(e)}")
+            print(f"Error removing {filename} from vector store: {str(e)}")
+        previous = manifest["files"].pop(filename, None)
+        index_changed = index_changed or bool(previous and previous.get("chunks"))
+    
+    # The version invalidates the response cache and the answer bank, so it
+    # is only bumped when stored chunks actually change
+    if index_changed:
+        manifest["version"] += 1
+    save_manifest(manifest)
     
-    # Add documents in batches to avoid memory issues
+    # Process new and changed PDF files
+    total_chunks = 0
+    failed = 0
     batch_size = 100
-    batches = [all_documents[i:i + batch_size] for i in range(0, len(all_documents), batch_size)]
+    file_infos = {pdf_path: file_info for pdf_path, file_info in to_process}
+    print(f"Processing {len(to_process)} new or changed PDFs ({len(removed)} removed)...")
     
-    print("Adding documents to vector store...")
-    for batch in tqdm(batches, desc="Adding to vector store"):
+    extracted = iter_extracted_pdfs(list(file_infos), chunk_size, CHUNK_OVERLAP, workers=workers)
+    for result in tqdm(extracted, total=len(file_infos), desc="Processing PDFs"):
+        filename = os.path.basename(result["path"])
+        if result["error"]:
+            print(f"Error processing {filename}: {result['error']}")
+            record_failed_pdf(manifest, filename, file_infos[result["path"]], result["error"])
+            failed += 1
+            continue
+        
         try:
-            vectorstore.add_documents(batch)
+            # Add documents in batches to avoid memory issues
+            chunks = result["chunks"]
+            for i in range(0, len(chunks), batch_size):
+                batch = chunks[i:i + batch_size]
+                vectorstore.add_documents(
+                    [Document(page_content=text, metadata=metadata) for _, text, metadata in batch],
+                    ids=[chunk_id for chunk_id, _, _ in batch]
+                )
+                bm25_index.add(batch)
         except Exception as e:
-            print(f"Error adding batch: {str(e)}")
+            print(f"Error adding {filename} to vector store: {str(e)}")
+            # Drop the batches that were stored so the file is all or nothing
+            try:
+                collection.delete(where={"source": filename})
+                bm25_index.delete_source(filename)
+            except Exception:
+                pass
+            record_failed_pdf(manifest, filename, file_infos[result["path"]], str(e))
+            failed += 1
+            continue
+        
+        if chunks and not index_changed:
+            manifest["version"] += 1
+            index_changed = True
+        
+        # Record the file only once all of its chunks are stored, so an
+        # interrupted build resumes from the first unfinished file
+        manifest["files"][filename] = dict(file_infos[result["path"]], chunks=len(chunks), pages=result["pages"])
+        save_manifest(manifest)
+        total_chunks += len(chunks)
     
-    return f"✅ Vector store populated with {len(all_documents)} chunks from {len(pdf_paths)} PDF files"
\ No newline at end of file
+    return (f"✅ Vector store updated with {total_chunks} chunks from {len(to_process) - failed} PDF files "
+            f"({len(removed)} removed, {failed} failed, index version {manifest['version']})")
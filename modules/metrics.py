@@ -0,0 +1,273 @@
+"""
+Lightweight in-process metrics: span timers, counters and gauges.
+
+Hot paths wrap their work in `span("name")` (or decorate with `timed`) and
+bump counters with `increment`. Metrics are served in the Prometheus text
+format by a small HTTP server, and spans can also be appended to a local
+JSON-lines trace log. With METRICS_ENABLED=0 spans and counters are no-ops.
+"""
+import os
+import json
+import time
+import bisect
+import threading
+import functools
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from config import METRICS_ENABLED, METRICS_HOST, METRICS_PORT, TRACE_LOG_PATH
+
+PREFIX = "zaraa_"
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_lock = threading.Lock()
+_counters = {}    # (name, labels) -> value
+_histograms = {}  # (name, labels) -> [bucket counts..., count, sum]
+_gauges = {}      # name -> (help, function returning a number or {labels: value})
+_trace_file = None
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+def increment(name, value=1, **labels):
+    """
+    Add to a counter.
+
+    Args:
+        name: Counter name (exported as zaraa_<name>_total)
+        value: Amount to add
+        **labels: Label values
+    """
+    if not METRICS_ENABLED:
+        return
+    key = (name, _label_key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def observe(name, seconds, **labels):
+    """
+    Record a duration in a histogram.
+
+    Args:
+        name: Histogram name (exported as zaraa_<name>_seconds)
+        seconds: Duration
+        **labels: Label values
+    """
+    if not METRICS_ENABLED:
+        return
+    key = (name, _label_key(labels))
+    index = bisect.bisect_left(BUCKETS, seconds)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [0] * (len(BUCKETS) + 2)
+        if index < len(BUCKETS):
+            histogram[index] += 1
+        histogram[-2] += 1
+        histogram[-1] += seconds
+
+def register_gauge(name, func, help_text=""):
+    """
+    Register a gauge read when metrics are scraped.
+
+    Args:
+        name: Gauge name (exported as zaraa_<name>)
+        func: Function returning a number, or a dict mapping label tuples
+            ((label, value), ...) to numbers
+        help_text: Description shown in the exposition
+    """
+    _gauges[name] = (help_text, func)
+
+class _Span:
+    """
+    Times a block and records it in the <name> histogram and the trace log.
+    """
+
+    __slots__ = ("name", "labels", "start")
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        observe(self.name, duration, **self.labels)
+        if exc_type is not None:
+            increment(f"{self.name}_errors", **self.labels)
+        if _trace_file is not None:
+            _write_trace(self.name, duration, self.labels, exc_type)
+        return False
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NOOP_SPAN = _NoopSpan()
+
+def span(name, **labels):
+    """
+    Time a block of code.
+
+    Example:
+        with span("retrieval", mode="hybrid"):
+            documents = retriever.invoke(query)
+
+    Args:
+        name: Span name (exported as zaraa_<name>_seconds)
+        **labels: Label values
+
+    Returns:
+        A context manager
+    """
+    if not METRICS_ENABLED:
+        return _NOOP_SPAN
+    return _Span(name, labels)
+
+def timed(name, **labels):
+    """
+    Decorator timing every call of a function as a span.
+
+    Returns the function unchanged when metrics are disabled.
+    """
+    def decorator(func):
+        if not METRICS_ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _Span(name, labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def _write_trace(name, duration, labels, exc_type):
+    record = {
+        "span": name,
+        "end": time.time(),
+        "duration_ms": round(duration * 1000, 3),
+        "labels": labels,
+        "thread": threading.current_thread().name,
+    }
+    if exc_type is not None:
+        record["error"] = exc_type.__name__
+    line = json.dumps(record, ensure_ascii=False, default=str)
+    with _lock:
+        _trace_file.write(line + "\n")
+
+def open_trace_log(path=TRACE_LOG_PATH):
+    """
+    Start appending spans to a JSON-lines trace log.
+
+    Args:
+        path: Log file path (no-op if empty or metrics are disabled)
+    """
+    global _trace_file
+    if not path or not METRICS_ENABLED or _trace_file is not None:
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    _trace_file = open(path, "a", encoding="utf-8", buffering=1)
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    body = ",".join(f'{key}="{str(value)}"'.replace("\n", " ") for key, value in labels)
+    return "{" + body + "}"
+
+def render_prometheus():
+    """
+    Render every metric in the Prometheus text exposition format.
+
+    Returns:
+        str: The exposition
+    """
+    lines = []
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: list(value) for key, value in _histograms.items()}
+
+    for name in sorted({name for name, _ in counters}):
+        metric = f"{PREFIX}{name}_total"
+        lines.append(f"# TYPE {metric} counter")
+        for (counter_name, labels), value in sorted(counters.items()):
+            if counter_name == name:
+                lines.append(f"{metric}{_format_labels(labels)} {value}")
+
+    for name in sorted({name for name, _ in histograms}):
+        metric = f"{PREFIX}{name}_seconds"
+        lines.append(f"# TYPE {metric} histogram")
+        for (histogram_name, labels), values in sorted(histograms.items()):
+            if histogram_name != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(BUCKETS, values):
+                cumulative += count
+                lines.append(f"{metric}_bucket{_format_labels(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{metric}_bucket{_format_labels(labels + (('le', '+Inf'),))} {values[-2]}")
+            lines.append(f"{metric}_count{_format_labels(labels)} {values[-2]}")
+            lines.append(f"{metric}_sum{_format_labels(labels)} {values[-1]:.6f}")
+
+    for name, (help_text, func) in sorted(_gauges.items()):
+        metric = f"{PREFIX}{name}"
+        try:
+            value = func()
+        except Exception as e:
+            print(f"Error reading gauge {name}: {str(e)}")
+            continue
+        if help_text:
+            lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} gauge")
+        values = value.items() if isinstance(value, dict) else [((), value)]
+        for labels, number in values:
+            lines.append(f"{metric}{_format_labels(labels)} {number}")
+
+    return "\n".join(lines) + "\n"
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes are too frequent to log
+        pass
+
+def start_metrics_server(port=METRICS_PORT, host=METRICS_HOST):
+    """
+    Serve /metrics in a background thread.
+
+    A port that cannot be bound only disables the endpoint; the app still
+    starts.
+
+    Args:
+        port: Port to listen on (0 or metrics disabled: no server)
+        host: Interface to bind (loopback by default)
+
+    Returns:
+        ThreadingHTTPServer or None: The server
+    """
+    if not METRICS_ENABLED or not port:
+        return None
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        print(f"⚠️ Metrics endpoint disabled, could not bind {host}:{port}: {str(e)}")
+        return None
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    print(f"Metrics available at http://{host}:{port}/metrics")
+    return server
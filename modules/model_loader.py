@@ -1,25 +1,48 @@
 """
 Model loading functions for the Smart Farming Assistant.
 """
+import os
 import torch
-from transformers import AutoImageProcessor, AutoModelForImageClassification
-from sentence_transformers import SentenceTransformer
-from datasets import load_dataset
-from config import MODEL_BEAN_CLASSIFIER, EMBEDDING_MODEL, DEVICE
+from modules.embeddings import get_embedding_service
+from modules.disease_index import load_disease_index
+from modules.onnx_backend import OnnxImageClassifier, onnx_model_path
+from config import (
+    MODEL_BEAN_CLASSIFIER, EMBEDDING_MODEL, DEVICE, PLANT_DISEASE_DATASET, DISEASE_INDEX_PATH,
+    INFERENCE_BACKEND, ONNX_QUANTIZED
+)
 
-def load_image_classification_model():
+def load_image_classification_model(model_name=MODEL_BEAN_CLASSIFIER, backend=INFERENCE_BACKEND):
     """
-    Load the plant disease classification model.
+    Load an image classification model (the plant disease model by default).
     
+    Args:
+        model_name: Hugging Face model id
+        backend: "torch" for the PyTorch model, "onnx" for the exported
+            ONNX Runtime model (falls back to torch if it was not exported)
+        
     Returns:
         tuple: (processor, model, class_labels) tuple
     """
+    # Imported here because transformers is slow to import and this only
+    # runs when a model is first needed
+    from transformers import AutoConfig, AutoImageProcessor, AutoModelForImageClassification
+    
     # Load image processor
-    processor = AutoImageProcessor.from_pretrained(MODEL_BEAN_CLASSIFIER)
+    processor = AutoImageProcessor.from_pretrained(model_name)
     
     # Load classification model
-    model = AutoModelForImageClassification.from_pretrained(MODEL_BEAN_CLASSIFIER)
-    model = model.to(DEVICE)
+    model = None
+    if backend == "onnx":
+        path = onnx_model_path(model_name, quantized=ONNX_QUANTIZED)
+        if os.path.exists(path):
+            model = OnnxImageClassifier(path, AutoConfig.from_pretrained(model_name))
+        else:
+            print(f"ONNX model not found at {path}; run export_onnx.py. Using PyTorch for {model_name}.")
+    
+    if model is None:
+        model = AutoModelForImageClassification.from_pretrained(model_name)
+        model = model.to(DEVICE)
+        model.eval()
     
     # Get class labels
     class_labels = model.config.id2label
@@ -28,22 +51,47 @@ def load_image_classification_model():
 
 def load_embeddings_model():
     """
-    Load the sentence embeddings model.
+    Get the shared sentence embeddings model.
     
     Returns:
-        SentenceTransformer: The embeddings model
+        EmbeddingService: The process-wide embedding service
     """
-    return SentenceTransformer(EMBEDDING_MODEL)
+    return get_embedding_service()
 
-def load_plant_dataset():
+def load_plant_dataset(index_path=DISEASE_INDEX_PATH):
     """
-    Load the plant disease dataset.
+    Load the plant disease descriptions and their embeddings.
+    
+    Uses the memory-mapped index written by build_disease_index.py when it
+    exists, and otherwise downloads and embeds the dataset.
     
+    Args:
+        index_path: Path to the precomputed disease index file
+        
     Returns:
         tuple: (descriptions, labels, embeddings) tuple
     """
+    if os.path.exists(index_path):
+        try:
+            return load_disease_index(index_path, expected_model=EMBEDDING_MODEL)
+        except (OSError, ValueError) as e:
+            print(f"Error loading disease index, rebuilding in memory: {str(e)}")
+    else:
+        print(f"Disease index not found at {index_path}; run build_disease_index.py to speed up startup.")
+    
+    return compute_plant_dataset_embeddings()
+
+def compute_plant_dataset_embeddings():
+    """
+    Download the plant disease dataset and embed its descriptions.
+    
+    Returns:
+        tuple: (descriptions, labels, embeddings) tuple
+    """
+    from datasets import load_dataset
+    
     # Load dataset
-    dataset = load_dataset("ipranavks/plant-disease-datasetog")
+    dataset = load_dataset(PLANT_DISEASE_DATASET)
     
     # Extract descriptions and labels
     descriptions = [sample['description'] for sample in dataset['train']]
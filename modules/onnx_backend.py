@@ -0,0 +1,141 @@
+"""
+ONNX Runtime CPU backend for the ViT image classifiers.
+
+Models are exported once with export_onnx.py (optionally int8 dynamically
+quantized) and then served through OnnxImageClassifier, which mimics the
+parts of the transformers model interface the app relies on.
+"""
+import os
+from types import SimpleNamespace
+import numpy as np
+import torch
+from config import ONNX_DIR, ONNX_INTRA_OP_THREADS, ONNX_INTER_OP_THREADS
+
+def onnx_model_path(model_name, quantized=False, onnx_dir=ONNX_DIR):
+    """
+    Get the path of the exported ONNX file for a Hugging Face model.
+
+    Args:
+        model_name: Hugging Face model id
+        quantized: Whether to use the int8 quantized variant
+        onnx_dir: Directory holding exported models
+
+    Returns:
+        str: Path to the .onnx file
+    """
+    suffix = ".int8.onnx" if quantized else ".onnx"
+    return os.path.join(onnx_dir, model_name.replace("/", "__") + suffix)
+
+class _LogitsOnly(torch.nn.Module):
+    """
+    Wrapper exporting only the logits of a transformers classifier.
+    """
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, pixel_values):
+        return self.model(pixel_values=pixel_values).logits
+
+def export_onnx_model(model, output_path, image_size=224, opset=17):
+    """
+    Export an image classification model to ONNX with a dynamic batch axis.
+
+    Args:
+        model: transformers image classification model
+        output_path: Path of the .onnx file to write
+        image_size: Input height/width
+        opset: ONNX opset version
+    """
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    model = model.to("cpu").eval()
+    dummy = torch.randn(1, 3, image_size, image_size)
+
+    with torch.no_grad():
+        torch.onnx.export(
+            _LogitsOnly(model),
+            (dummy,),
+            output_path,
+            input_names=["pixel_values"],
+            output_names=["logits"],
+            dynamic_axes={"pixel_values": {0: "batch"}, "logits": {0: "batch"}},
+            opset_version=opset,
+            do_constant_folding=True
+        )
+
+def quantize_onnx_model(input_path, output_path):
+    """
+    Apply int8 dynamic quantization to an exported ONNX model.
+
+    Args:
+        input_path: Path of the fp32 .onnx file
+        output_path: Path of the quantized .onnx file to write
+    """
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    quantize_dynamic(input_path, output_path, weight_type=QuantType.QInt8)
+
+class OnnxImageClassifier:
+    """
+    Image classifier running on ONNX Runtime's CPU execution provider.
+
+    Args:
+        path: Path to the .onnx file
+        config: The original model's transformers config (for id2label)
+        intra_op_threads: Threads used inside an operator
+        inter_op_threads: Threads used across independent operators
+    """
+
+    def __init__(self, path, config, intra_op_threads=ONNX_INTRA_OP_THREADS, inter_op_threads=ONNX_INTER_OP_THREADS):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+
+        self.path = path
+        self.config = config
+        self.device = torch.device("cpu")
+        self.session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+
+    def __call__(self, pixel_values, **kwargs):
+        pixel_values = pixel_values.detach().cpu().numpy().astype(np.float32, copy=False)
+        (logits,) = self.session.run(["logits"], {"pixel_values": pixel_values})
+        return SimpleNamespace(logits=torch.from_numpy(logits))
+
+    def to(self, device):
+        return self
+
+    def eval(self):
+        return self
+
+def check_parity(torch_model, onnx_model, pixel_values, atol=1e-2, min_top1_agreement=1.0):
+    """
+    Compare ONNX logits against the PyTorch model on the same inputs.
+
+    Args:
+        torch_model: Reference transformers model
+        onnx_model: OnnxImageClassifier to check
+        pixel_values: (batch, channels, height, width) input tensor
+        atol: Maximum allowed absolute logit difference
+        min_top1_agreement: Minimum fraction of inputs with the same argmax
+
+    Returns:
+        dict: max_abs_diff, top1_agreement (fraction of matching argmax)
+        and ok (whether both checks passed)
+    """
+    with torch.no_grad():
+        expected = torch_model(pixel_values=pixel_values.to(torch_model.device)).logits.cpu().float()
+    actual = onnx_model(pixel_values=pixel_values).logits.float()
+
+    max_abs_diff = (expected - actual).abs().max().item()
+    top1_agreement = (expected.argmax(-1) == actual.argmax(-1)).float().mean().item()
+
+    return {
+        "max_abs_diff": max_abs_diff,
+        "top1_agreement": top1_agreement,
+        "ok": max_abs_diff <= atol and top1_agreement >= min_top1_agreement
+    }
@@ -0,0 +1,44 @@
+"""
+Shared HTTP clients for OpenAI API calls.
+
+Every ChatOpenAI instance and the Whisper client use the same connection
+pools, so keep-alive connections to the API are reused across requests.
+"""
+import threading
+import httpx
+from config import OPENAI_MAX_CONNECTIONS, OPENAI_TIMEOUT
+
+_http_client = None
+_async_http_client = None
+_lock = threading.Lock()
+
+def _limits():
+    return httpx.Limits(max_connections=OPENAI_MAX_CONNECTIONS, max_keepalive_connections=OPENAI_MAX_CONNECTIONS)
+
+def get_http_client():
+    """
+    Get the process-wide synchronous HTTP client.
+
+    Returns:
+        httpx.Client: Shared client with a keep-alive connection pool
+    """
+    global _http_client
+    if _http_client is None:
+        with _lock:
+            if _http_client is None:
+                _http_client = httpx.Client(limits=_limits(), timeout=OPENAI_TIMEOUT)
+    return _http_client
+
+def get_async_http_client():
+    """
+    Get the process-wide asynchronous HTTP client.
+
+    Returns:
+        httpx.AsyncClient: Shared client with a keep-alive connection pool
+    """
+    global _async_http_client
+    if _async_http_client is None:
+        with _lock:
+            if _async_http_client is None:
+                _async_http_client = httpx.AsyncClient(limits=_limits(), timeout=OPENAI_TIMEOUT)
+    return _async_http_client
@@ -0,0 +1,144 @@
+"""
+Parallel PDF text extraction and chunking.
+
+This module is deliberately lightweight (no models, no vector store) because
+it is imported by the extraction worker processes, which are spawned rather
+than forked: the app's threads (Gradio, warmup, HTTP pools) and the loaded
+models must not be copied into them. A spawned worker also re-runs the top
+level of the entry script (as __mp_main__), so entry points that ingest
+(main.py, build_chroma_once.py) import the app and the vector store inside
+their main functions.
+"""
+import os
+import queue
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import fitz  # PyMuPDF
+from config import CHUNK_SIZE, CHUNK_OVERLAP, INGEST_WORKERS, INGEST_QUEUE_SIZE
+
+# Marks the end of the extraction stream
+_DONE = object()
+
+def extract_pdf_chunks(pdf_path, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
+    """
+    Extract text chunks from a single PDF file.
+
+    Args:
+        pdf_path: Path to the PDF file
+        chunk_size: Number of words per chunk
+        chunk_overlap: Number of words shared by consecutive chunks
+
+    Returns:
+        dict: {"path", "chunks", "pages", "error"} where chunks is a list of
+        (chunk_id, text, metadata) tuples
+    """
+    filename = os.path.basename(pdf_path)
+    result = {"path": pdf_path, "chunks": [], "pages": 0, "error": None}
+
+    try:
+        with fitz.open(pdf_path) as doc:
+            result["pages"] = doc.page_count
+            for page_num, page in enumerate(doc):
+                text = page.get_text()
+                if not text.strip():
+                    continue
+
+                # Split into smaller chunks with overlap
+                words = text.split()
+                chunks = [" ".join(words[i:i + chunk_size]) for i in range(0, len(words), chunk_size - chunk_overlap)]
+
+                for i, chunk_text in enumerate(chunks):
+                    if not chunk_text.strip():
+                        continue
+
+                    metadata = {"source": filename, "page": page_num + 1, "chunk": i}
+                    result["chunks"].append((f"{filename}:{page_num + 1}:{i}", chunk_text, metadata))
+    except Exception as e:
+        result["error"] = str(e)
+
+    return result
+
+def _produce(pdf_paths, chunk_size, chunk_overlap, workers, out_queue, stop_event):
+    """
+    Run extraction in a process pool and push per-file results into out_queue.
+
+    At most `workers` files are extracted at a time and the queue is bounded,
+    so a slow consumer stalls the pool instead of piling up chunks in memory.
+    """
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            pending = iter(pdf_paths)
+            in_flight = set()
+
+            while not stop_event.is_set():
+                for pdf_path in pending:
+                    in_flight.add(executor.submit(extract_pdf_chunks, pdf_path, chunk_size, chunk_overlap))
+                    if len(in_flight) >= workers:
+                        break
+
+                if not in_flight:
+                    break
+
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    out_queue.put(future.result())
+
+            for future in in_flight:
+                future.cancel()
+    except Exception as e:
+        out_queue.put(e)
+    finally:
+        out_queue.put(_DONE)
+
+def iter_extracted_pdfs(pdf_paths, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP,
+                        workers=INGEST_WORKERS, queue_size=INGEST_QUEUE_SIZE):
+    """
+    Extract PDFs across worker processes and stream the results.
+
+    Results are yielded in completion order as soon as each file is done, so
+    the caller can embed and insert chunks while other files are still being
+    parsed.
+
+    Args:
+        pdf_paths: List of PDF file paths
+        chunk_size: Number of words per chunk
+        chunk_overlap: Number of words shared by consecutive chunks
+        workers: Number of extraction processes (1 extracts in-process)
+        queue_size: Maximum number of extracted files waiting to be consumed
+
+    Yields:
+        dict: Extraction result for one PDF (see extract_pdf_chunks)
+    """
+    workers = max(1, min(workers, len(pdf_paths)))
+    if workers == 1:
+        for pdf_path in pdf_paths:
+            yield extract_pdf_chunks(pdf_path, chunk_size, chunk_overlap)
+        return
+
+    out_queue = queue.Queue(maxsize=queue_size)
+    stop_event = threading.Event()
+    producer = threading.Thread(
+        target=_produce,
+        args=(pdf_paths, chunk_size, chunk_overlap, workers, out_queue, stop_event),
+        name="pdf-extraction",
+        daemon=True
+    )
+    producer.start()
+
+    try:
+        while True:
+            item = out_queue.get()
+            if item is _DONE:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # Unblock the producer if the consumer stopped early
+        stop_event.set()
+        while producer.is_alive():
+            try:
+                out_queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
@@ -0,0 +1,181 @@
+"""
+Content-addressed cache of image classifier outputs.
+
+Gradio re-fires change/click events with the same file, and users re-upload
+the same photo, so logits are cached per model keyed by a hash of the image
+content. A repeat analysis (see image_pipeline.analyze_image) is a hash and
+a dictionary lookup instead of a decode and a forward pass. Optionally, a
+64-bit difference hash (dHash) also matches re-encoded or resized copies of
+a cached image.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from PIL import Image
+from modules.metrics import increment
+from config import PREDICTION_CACHE_ENABLED, PREDICTION_CACHE_MAX_ENTRIES, PREDICTION_CACHE_DHASH_DISTANCE
+
+def content_key(image, block_size=1 << 20):
+    """
+    Hash an image's content.
+
+    Args:
+        image: Path to an image file or PIL image
+        block_size: Read block size in bytes
+
+    Returns:
+        str: Hex digest of the file bytes (or of the decoded pixels)
+    """
+    digest = hashlib.sha256()
+    if isinstance(image, str):
+        with open(image, "rb") as f:
+            for block in iter(lambda: f.read(block_size), b""):
+                digest.update(block)
+    else:
+        digest.update(f"{image.mode}:{image.size}".encode("utf-8"))
+        digest.update(image.tobytes())
+    return digest.hexdigest()
+
+def dhash(image, size=8):
+    """
+    Compute the difference hash of an image.
+
+    The image is shrunk to (size + 1) x size grayscale pixels and each bit
+    records whether a pixel is brighter than its right neighbour, so the
+    hash survives re-encoding and resizing.
+
+    Args:
+        image: PIL image
+        size: Hash side length (size * size bits)
+
+    Returns:
+        int: The hash
+    """
+    pixels = list(image.convert("L").resize((size + 1, size), Image.BILINEAR).getdata())
+    value = 0
+    for row in range(size):
+        for col in range(size):
+            offset = row * (size + 1) + col
+            value = (value << 1) | (pixels[offset] > pixels[offset + 1])
+    return value
+
+class PredictionCache:
+    """
+    LRU cache of classifier logits keyed by (model, image content hash).
+
+    Args:
+        max_entries: Maximum number of cached predictions
+        dhash_distance: Maximum dHash Hamming distance for a near-duplicate
+            match (0 for exact content matches only)
+        enabled: If False, nothing is cached
+    """
+
+    def __init__(self, max_entries=PREDICTION_CACHE_MAX_ENTRIES, dhash_distance=PREDICTION_CACHE_DHASH_DISTANCE,
+                 enabled=PREDICTION_CACHE_ENABLED):
+        self.max_entries = max_entries
+        self.dhash_distance = dhash_distance
+        self.enabled = enabled
+        self._entries = OrderedDict()  # (model, content key) -> (logits, dhash)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    def get(self, model, key):
+        """
+        Look up cached logits by image content.
+
+        Args:
+            model: Model name the logits belong to
+            key: content_key of the image
+
+        Returns:
+            torch.Tensor or None: (1, num_labels) logits, or None on a miss
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get((model, key))
+            if entry is None:
+                return None
+            self._entries.move_to_end((model, key))
+            self.hits += 1
+        increment("prediction_cache_lookups", model=model, result="hit")
+        return entry[0]
+
+    def get_near(self, model, image_hash):
+        """
+        Look up cached logits of a near-duplicate image.
+
+        Args:
+            model: Model name the logits belong to
+            image_hash: dhash of the image
+
+        Returns:
+            torch.Tensor or None: Logits of the closest cached image within
+            dhash_distance, or None
+        """
+        if not self.enabled or not self.dhash_distance:
+            return None
+        with self._lock:
+            best_key, best_distance = None, self.dhash_distance + 1
+            for key, (_, cached_hash) in self._entries.items():
+                if key[0] != model or cached_hash is None:
+                    continue
+                distance = bin(image_hash ^ cached_hash).count("1")
+                if distance < best_distance:
+                    best_key, best_distance = key, distance
+            if best_key is None:
+                return None
+            self._entries.move_to_end(best_key)
+            self.near_hits += 1
+            logits = self._entries[best_key][0]
+        increment("prediction_cache_lookups", model=model, result="near_hit")
+        return logits
+
+    def put(self, model, key, logits, image_hash=None):
+        """
+        Cache the logits computed for an image (counted as a miss).
+
+        Args:
+            model: Model name the logits belong to
+            key: content_key of the image
+            logits: (1, num_labels) logits
+            image_hash: dhash of the image, for near-duplicate lookups
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self.misses += 1
+            self._entries[(model, key)] = (logits.detach().cpu(), image_hash)
+            self._entries.move_to_end((model, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        increment("prediction_cache_lookups", model=model, result="miss")
+
+    def clear(self):
+        """
+        Drop every cached prediction.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Get the cache's size and hit counters.
+
+        Returns:
+            dict: entries, hits, near_hits, misses and hit_rate
+        """
+        with self._lock:
+            lookups = self.hits + self.near_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.near_hits) / lookups if lookups else 0.0,
+            }
+
+# Shared by the disease and fruit/vegetable classifiers
+prediction_cache = PredictionCache()
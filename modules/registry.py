@@ -0,0 +1,173 @@
+"""
+Lazy registry for models, chains and other expensive components.
+
+Modules register a factory at import time (which is cheap); the component is
+only built the first time it is requested with get(), or ahead of time by
+the background warmup started after the UI is up. Build times are recorded
+for the startup timing breakdown.
+"""
+import time
+import threading
+
+_factories = {}
+_instances = {}
+_states = {}
+_timings = {}
+_warm = []
+_locks = {}
+_registry_lock = threading.Lock()
+
+PENDING = "pending"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+# The factory returned None (disabled, no API key or a build that failed and
+# was reported by the factory itself)
+UNAVAILABLE = "unavailable"
+
+def register(name, factory, warm=True):
+    """
+    Register a component factory.
+
+    Args:
+        name: Unique component name
+        factory: Zero-argument callable that builds the component
+        warm: Whether the background warmup should build it
+    """
+    with _registry_lock:
+        _factories[name] = factory
+        _states.setdefault(name, PENDING)
+        _locks.setdefault(name, threading.Lock())
+        if warm and name not in _warm:
+            _warm.append(name)
+
+def get(name):
+    """
+    Get a component, building it on first use.
+
+    Concurrent callers wait for a single build. If the factory raises, the
+    error is propagated and the next call retries; if it returns None, None
+    is returned and not cached, so the next call retries as well.
+
+    Args:
+        name: Component name
+
+    Returns:
+        object: The component
+    """
+    if name in _instances:
+        return _instances[name]
+    if name not in _factories:
+        raise KeyError(f"Unknown component: {name}")
+
+    with _locks[name]:
+        if name in _instances:
+            return _instances[name]
+
+        _states[name] = LOADING
+        start = time.perf_counter()
+        try:
+            instance = _factories[name]()
+        except Exception as e:
+            _states[name] = f"{FAILED}: {str(e)}"
+            raise
+        finally:
+            _timings[name] = time.perf_counter() - start
+
+        if instance is None:
+            _states[name] = UNAVAILABLE
+            return None
+
+        _instances[name] = instance
+        _states[name] = READY
+        return instance
+
+def warmup_names():
+    """
+    Get the components built by the default warmup, in registration order.
+    """
+    return list(_warm)
+
+def is_ready(name):
+    """
+    Check whether a component has been built.
+    """
+    return name in _instances
+
+def record_timing(stage, seconds):
+    """
+    Record the duration of a startup stage that is not a registered component.
+    """
+    _timings[stage] = seconds
+
+def warmup(names=None, background=True):
+    """
+    Build components ahead of their first use.
+
+    Failures are reported but do not stop the remaining components.
+
+    Args:
+        names: Components to build (defaults to every component registered
+            with warm=True, in registration order)
+        background: Run in a daemon thread instead of blocking
+
+    Returns:
+        threading.Thread or None: The warmup thread when background is True
+    """
+    names = list(_warm) if names is None else list(names)
+
+    def run():
+        for name in names:
+            try:
+                get(name)
+            except Exception as e:
+                print(f"Error warming up {name}: {str(e)}")
+        print(format_timings())
+
+    if not background:
+        run()
+        return None
+
+    thread = threading.Thread(target=run, name="warmup", daemon=True)
+    thread.start()
+    return thread
+
+def status():
+    """
+    Get the readiness state and build time of every component.
+
+    Returns:
+        dict: Mapping of name to {"state", "seconds"}
+    """
+    return {
+        name: {"state": _states[name], "seconds": _timings.get(name)}
+        for name in _factories
+    }
+
+def format_timings():
+    """
+    Format the recorded startup and component build times.
+
+    Returns:
+        str: One line per stage, slowest first
+    """
+    lines = ["Startup timing breakdown:"]
+    for stage, seconds in sorted(_timings.items(), key=lambda item: -item[1]):
+        lines.append(f"  {stage:<28} {seconds:8.2f}s")
+    return "\n".join(lines)
+
+def format_status():
+    """
+    Format component readiness as Markdown for the UI.
+
+    Returns:
+        str: Markdown list of components with their state and build time
+    """
+    icons = {READY: "✅", LOADING: "⏳", PENDING: "💤", UNAVAILABLE: "➖"}
+    lines = []
+    for name, info in status().items():
+        state = info["state"]
+        icon = icons.get(state, "⚠️")
+        seconds = f" ({info['seconds']:.1f}s)" if info["seconds"] is not None and state != LOADING else ""
+        lines.append(f"- {icon} **{name}**: {state}{seconds}")
+    return "\n".join(lines) or "No components registered."
@@ -0,0 +1,189 @@
+"""
+Semantic cache of knowledge base answers.
+
+Queries are normalized and embedded; a new query is served from the cache
+when an earlier answer's query embedding is similar enough. Entries expire
+after a TTL, the least recently used entries are evicted when the cache is
+full, and everything is dropped when the knowledge base index version
+changes.
+"""
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+from modules.knowledge_base import get_index_version
+from modules.metrics import increment
+from config import (
+    CHROMA_MANIFEST_PATH, RESPONSE_CACHE_ENABLED, RESPONSE_CACHE_THRESHOLD, RESPONSE_CACHE_TTL,
+    RESPONSE_CACHE_MAX_ENTRIES
+)
+
+def normalize_query(query):
+    """
+    Normalize a query for caching (case, whitespace and punctuation).
+
+    Args:
+        query: Raw user query
+
+    Returns:
+        str: Normalized query
+    """
+    query = re.sub(r"[^\w\s']", " ", query.lower())
+    return " ".join(query.split())
+
+class SemanticResponseCache:
+    """
+    Embedding-keyed LRU cache with a similarity threshold and TTL.
+
+    Args:
+        embedder: Object with an encode(text, normalize_embeddings=True) method
+        threshold: Minimum cosine similarity for a cache hit
+        ttl: Seconds an entry stays valid
+        max_entries: Maximum number of cached answers
+        enabled: If False, get always misses and put is a no-op
+        manifest_path: Knowledge base manifest, watched for index changes
+    """
+
+    def __init__(self, embedder, threshold=RESPONSE_CACHE_THRESHOLD, ttl=RESPONSE_CACHE_TTL,
+                 max_entries=RESPONSE_CACHE_MAX_ENTRIES, enabled=RESPONSE_CACHE_ENABLED,
+                 manifest_path=CHROMA_MANIFEST_PATH):
+        self.embedder = embedder
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self.manifest_path = manifest_path
+        self._entries = OrderedDict()  # normalized query -> (embedding, value, created_at)
+        self._matrix = None
+        self._matrix_keys = []
+        self._lock = threading.Lock()
+        self._index_version = None
+        self._manifest_mtime = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, query):
+        """
+        Look up a cached answer for a query.
+
+        Args:
+            query: User query
+
+        Returns:
+            object: The cached value, or None on a miss
+        """
+        if not self.enabled:
+            return None
+
+        key = normalize_query(query)
+        self._check_index_version()
+
+        with self._lock:
+            self._expire()
+            match = key if key in self._entries else None
+
+        if match is None and self._entries:
+            embedding = self.embedder.encode(key, normalize_embeddings=True)
+            with self._lock:
+                match = self._nearest(embedding)
+
+        with self._lock:
+            if match is None or match not in self._entries:
+                self.misses += 1
+                increment("response_cache_lookups", result="miss")
+                return None
+            self._entries.move_to_end(match)
+            self.hits += 1
+            increment("response_cache_lookups", result="hit")
+            return self._entries[match][1]
+
+    def put(self, query, value):
+        """
+        Cache an answer for a query.
+
+        Args:
+            query: User query
+            value: Answer to cache
+        """
+        if not self.enabled:
+            return
+
+        key = normalize_query(query)
+        embedding = np.asarray(self.embedder.encode(key, normalize_embeddings=True), dtype=np.float32)
+
+        with self._lock:
+            self._entries[key] = (embedding, value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def clear(self):
+        """
+        Drop every cached answer.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def stats(self):
+        """
+        Get cache counters.
+
+        Returns:
+            dict: Entries, hits, misses, hit rate and invalidations
+        """
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "index_version": self._index_version,
+        }
+
+    def _nearest(self, embedding):
+        # Called with the lock held
+        if self._matrix is None:
+            self._matrix_keys = list(self._entries)
+            self._matrix = np.stack([self._entries[k][0] for k in self._matrix_keys]) if self._matrix_keys else None
+        if self._matrix is None:
+            return None
+
+        similarities = self._matrix @ np.asarray(embedding, dtype=np.float32)
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.threshold:
+            return None
+        return self._matrix_keys[best]
+
+    def _expire(self):
+        # Called with the lock held; entries are in LRU order, not creation
+        # order, so scan them all
+        now = time.monotonic()
+        expired = [key for key, (_, _, created) in self._entries.items() if now - created > self.ttl]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
+
+    def _check_index_version(self):
+        # Only re-read the manifest when its modification time changes
+        try:
+            mtime = os.stat(self.manifest_path).st_mtime
+        except OSError:
+            mtime = None
+        if mtime == self._manifest_mtime and self._index_version is not None:
+            return
+
+        self._manifest_mtime = mtime
+        version = get_index_version(self.manifest_path)
+        if self._index_version is not None and version != self._index_version:
+            self.clear()
+            self.invalidations += 1
+            print(f"Knowledge base index changed (version {version}), response cache cleared.")
+        self._index_version = version
@@ -0,0 +1,122 @@
+"""
+Hybrid (BM25 + dense) knowledge base retrieval.
+
+Both retrievers return a candidate list, the lists are merged with
+reciprocal rank fusion, and an optional local cross-encoder re-scores the
+best fused candidates before the top k are returned.
+"""
+import hashlib
+import threading
+from typing import Any, Optional
+from langchain_core.retrievers import BaseRetriever
+from modules.metrics import span
+from config import (
+    RETRIEVAL_K, RETRIEVAL_CANDIDATES, RRF_K, RERANKER_ENABLED, RERANKER_MODEL, RERANK_CANDIDATES, DEVICE
+)
+
+def document_key(doc):
+    """
+    Identify a chunk independently of the retriever that returned it.
+    """
+    digest = hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest()
+    return (doc.metadata.get("source"), doc.metadata.get("page"), digest)
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """
+    Merge ranked document lists with reciprocal rank fusion.
+
+    Each document scores sum(1 / (k + rank)) over the lists it appears in,
+    so chunks ranked well by both retrievers come first.
+
+    Args:
+        rankings: Lists of documents, each best first
+        k: Rank smoothing constant
+
+    Returns:
+        list: (document, score) pairs, best first
+    """
+    scores, docs = {}, {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = document_key(doc)
+            docs.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return [(docs[key], score) for key, score in sorted(scores.items(), key=lambda item: -item[1])]
+
+class CrossEncoderReranker:
+    """
+    Re-score (query, chunk) pairs with a local cross-encoder, loaded on first use.
+
+    Args:
+        model_name: sentence-transformers CrossEncoder model
+        device: "cpu" or "cuda"
+    """
+
+    def __init__(self, model_name=RERANKER_MODEL, device=DEVICE):
+        self.model_name = model_name
+        self.device = device
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    from sentence_transformers import CrossEncoder
+                    self._model = CrossEncoder(self.model_name, device=self.device)
+        return self._model
+
+    def rerank(self, query, documents):
+        """
+        Sort documents by cross-encoder relevance to the query.
+
+        Returns:
+            list: The documents, most relevant first
+        """
+        if not documents:
+            return []
+        scores = self.model.predict([(query, doc.page_content) for doc in documents])
+        order = sorted(range(len(documents)), key=lambda i: -float(scores[i]))
+        return [documents[i] for i in order]
+
+class HybridRetriever(BaseRetriever):
+    """
+    LangChain retriever fusing Chroma similarity search with BM25.
+
+    Attributes:
+        vectorstore: Chroma vector store
+        bm25_index: BM25Index over the same chunks
+        k: Number of documents returned
+        candidates: Candidates taken from each retriever before fusion
+        reranker: Optional CrossEncoderReranker
+        rerank_candidates: Maximum fused candidates scored by the reranker
+    """
+
+    vectorstore: Any
+    bm25_index: Any
+    k: int = RETRIEVAL_K
+    candidates: int = RETRIEVAL_CANDIDATES
+    reranker: Optional[Any] = None
+    rerank_candidates: int = RERANK_CANDIDATES
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        with span("dense_search"):
+            dense = self.vectorstore.similarity_search(query, k=self.candidates)
+        with span("bm25_search"):
+            sparse = [doc for doc, _ in self.bm25_index.search(query, k=self.candidates)]
+        fused = [doc for doc, _ in reciprocal_rank_fusion([dense, sparse])]
+
+        if self.reranker is not None:
+            with span("rerank"):
+                fused = self.reranker.rerank(query, fused[:self.rerank_candidates])
+        return fused[:self.k]
+
+def create_reranker():
+    """
+    Get the configured reranker.
+
+    Returns:
+        CrossEncoderReranker or None: None when re-ranking is disabled
+    """
+    return CrossEncoderReranker() if RERANKER_ENABLED else None
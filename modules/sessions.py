@@ -0,0 +1,274 @@
+"""
+Per-session conversation state.
+
+Every Gradio session (browser tab) gets its own follow-up topic, chat turns
+and agent memory instead of sharing process-wide globals. Histories are kept
+within a turn and token budget, idle sessions are evicted, and state can be
+kept in memory or in a SQLite database that survives restarts.
+"""
+import os
+import copy
+import json
+import time
+import sqlite3
+import threading
+import contextvars
+from contextlib import contextmanager
+from collections import OrderedDict
+from langchain_core.memory import BaseMemory
+from langchain_core.messages import HumanMessage, AIMessage
+from modules.context_builder import count_tokens
+from config import (
+    SESSION_BACKEND, SESSION_DB_PATH, SESSION_IDLE_TTL, SESSION_MAX_SESSIONS, SESSION_MAX_TURNS,
+    SESSION_MAX_TOKENS
+)
+
+# Session used when no Gradio request is available (scripts, the CLI)
+DEFAULT_SESSION = "default"
+
+# How often idle sessions are looked for, in seconds
+EVICTION_INTERVAL = 60
+
+# Session the current agent call belongs to (see use_session)
+current_session = contextvars.ContextVar("current_session", default=DEFAULT_SESSION)
+
+def trim_turns(turns, max_turns=SESSION_MAX_TURNS, max_tokens=SESSION_MAX_TOKENS):
+    """
+    Keep the most recent turns that fit the turn and token budgets.
+
+    Args:
+        turns: List of [input, output] pairs, oldest first
+        max_turns: Maximum number of turns to keep
+        max_tokens: Maximum tokens across the kept turns
+
+    Returns:
+        list: The kept turns, oldest first (the latest turn is always kept)
+    """
+    kept = []
+    total = 0
+    for turn in reversed(turns[-max_turns:] if max_turns > 0 else []):
+        total += sum(count_tokens(text) for text in turn)
+        if kept and total > max_tokens:
+            break
+        kept.append(turn)
+    return kept[::-1]
+
+def new_session_state():
+    """
+    Get the state of a session that has not been seen before.
+
+    Returns:
+        dict: "last_topic", "turns" (chat exchanges), "agent_turns" (agent
+        memory) and "last_seen"
+    """
+    return {"last_topic": None, "turns": [], "agent_turns": [], "last_seen": time.time()}
+
+class SessionStore:
+    """
+    Session states keyed by session id, in memory or in SQLite.
+
+    Args:
+        backend: "memory" or "sqlite"
+        path: SQLite database path (sqlite backend only)
+        idle_ttl: Seconds of inactivity after which a session is dropped
+        max_sessions: Maximum number of sessions kept by the memory backend;
+            the least recently used ones are dropped first
+        max_turns: Maximum turns kept per history
+        max_tokens: Maximum tokens kept per history
+    """
+
+    def __init__(self, backend=SESSION_BACKEND, path=SESSION_DB_PATH, idle_ttl=SESSION_IDLE_TTL,
+                 max_sessions=SESSION_MAX_SESSIONS, max_turns=SESSION_MAX_TURNS, max_tokens=SESSION_MAX_TOKENS):
+        if backend not in ("memory", "sqlite"):
+            raise ValueError(f"Unknown session backend {backend!r}, expected 'memory' or 'sqlite'")
+
+        self.backend = backend
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self.max_turns = max_turns
+        self.max_tokens = max_tokens
+        self.evicted = 0
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()
+        self._last_eviction = time.monotonic()
+        self._conn = None
+
+        if backend == "sqlite":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, state TEXT NOT NULL, last_seen REAL NOT NULL)"
+            )
+            self._conn.commit()
+
+    def get(self, session_id):
+        """
+        Get a copy of a session's state.
+
+        Reading does not create the session; unknown ids get a fresh state.
+
+        Args:
+            session_id: Session id (None for the default session)
+
+        Returns:
+            dict: The session state (see new_session_state)
+        """
+        with self._lock:
+            self._maybe_evict()
+            return copy.deepcopy(self._load(session_id or DEFAULT_SESSION))
+
+    def update(self, session_id, func):
+        """
+        Atomically modify a session's state.
+
+        Args:
+            session_id: Session id (None for the default session)
+            func: Function mutating the state dict in place
+
+        Returns:
+            dict: A copy of the updated state
+        """
+        session_id = session_id or DEFAULT_SESSION
+        with self._lock:
+            self._maybe_evict()
+            state = self._load(session_id)
+            func(state)
+            state["turns"] = trim_turns(state["turns"], self.max_turns, self.max_tokens)
+            state["agent_turns"] = trim_turns(state["agent_turns"], self.max_turns, self.max_tokens)
+            state["last_seen"] = time.time()
+            self._save(session_id, state)
+            return copy.deepcopy(state)
+
+    def clear(self, session_id):
+        """
+        Forget a session.
+        """
+        session_id = session_id or DEFAULT_SESSION
+        with self._lock:
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+                self._conn.commit()
+            else:
+                self._sessions.pop(session_id, None)
+
+    def evict_idle(self):
+        """
+        Drop every session idle for longer than idle_ttl.
+
+        Returns:
+            int: Number of sessions dropped
+        """
+        with self._lock:
+            return self._evict_idle()
+
+    def stats(self):
+        """
+        Get the number of live sessions and evictions.
+
+        Returns:
+            dict: Backend, session count and evicted session count
+        """
+        with self._lock:
+            if self._conn is not None:
+                (count,) = self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()
+            else:
+                count = len(self._sessions)
+        return {"backend": self.backend, "sessions": count, "evicted": self.evicted}
+
+    def _load(self, session_id):
+        # Called with the lock held
+        if self._conn is not None:
+            row = self._conn.execute("SELECT state FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            return json.loads(row[0]) if row else new_session_state()
+
+        state = self._sessions.get(session_id)
+        if state is None:
+            return new_session_state()
+        self._sessions.move_to_end(session_id)
+        return state
+
+    def _save(self, session_id, state):
+        # Called with the lock held
+        if self._conn is not None:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (id, state, last_seen) VALUES (?, ?, ?)",
+                (session_id, json.dumps(state, ensure_ascii=False), state["last_seen"])
+            )
+            self._conn.commit()
+            return
+
+        self._sessions[session_id] = state
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.evicted += 1
+
+    def _maybe_evict(self):
+        # Called with the lock held; eviction is amortized over requests
+        if time.monotonic() - self._last_eviction >= EVICTION_INTERVAL:
+            self._evict_idle()
+
+    def _evict_idle(self):
+        # Called with the lock held
+        self._last_eviction = time.monotonic()
+        cutoff = time.time() - self.idle_ttl
+
+        if self._conn is not None:
+            removed = self._conn.execute("DELETE FROM sessions WHERE last_seen < ?", (cutoff,)).rowcount
+            self._conn.commit()
+        else:
+            idle = [session_id for session_id, state in self._sessions.items() if state["last_seen"] < cutoff]
+            for session_id in idle:
+                del self._sessions[session_id]
+            removed = len(idle)
+
+        self.evicted += removed
+        return removed
+
+# Conversation state of every connected session
+session_store = SessionStore()
+
+@contextmanager
+def use_session(session_id):
+    """
+    Run the enclosed code (e.g. an agent call) on behalf of a session.
+
+    Args:
+        session_id: Session id (None for the default session)
+    """
+    token = current_session.set(session_id or DEFAULT_SESSION)
+    try:
+        yield
+    finally:
+        current_session.reset(token)
+
+class SessionScopedMemory(BaseMemory):
+    """
+    LangChain memory that reads and writes the agent history of the current
+    session (see use_session), so one agent can serve every session.
+    """
+
+    memory_key: str = "chat_history"
+    input_key: str = "input"
+    output_key: str = "output"
+
+    @property
+    def memory_variables(self):
+        return [self.memory_key]
+
+    def load_memory_variables(self, inputs):
+        state = session_store.get(current_session.get())
+        messages = []
+        for user_input, output in state["agent_turns"]:
+            messages.append(HumanMessage(content=user_input))
+            messages.append(AIMessage(content=output))
+        return {self.memory_key: messages}
+
+    def save_context(self, inputs, outputs):
+        user_input = inputs.get(self.input_key, next(iter(inputs.values()), ""))
+        output = outputs.get(self.output_key, next(iter(outputs.values()), ""))
+        session_store.update(current_session.get(), lambda state: state["agent_turns"].append([user_input, output]))
+
+    def clear(self):
+        session_store.update(current_session.get(), lambda state: state["agent_turns"].clear())